@@ -1,75 +1,517 @@
 #!/usr/bin/env python3
 import time
+STARTUP_T0 = time.perf_counter()
 from datetime import datetime
-import psutil
 import subprocess
 import threading
-import tkinter as tk
-from tkinter import ttk
-from pythonosc import udp_client
+import queue
+import socket
+import fnmatch
 import re
 import os
+import sys
 import glob
-import tzlocal
-import ttkbootstrap as ttk
-from ttkbootstrap.constants import *
 import json
-import pyperclip
-import base64
-from io import BytesIO
-from PIL import Image, ImageTk
-import urllib.request
+import hashlib
+import math
+import importlib
+import argparse
+import logging
+import bisect
+import string
+import tempfile
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# Heavy or rarely needed modules are imported on first use to keep startup fast
+tk = LazyModule("tkinter")
+psutil = LazyModule("psutil")
+tzlocal = LazyModule("tzlocal")
+ttk = LazyModule("ttkbootstrap")
+pyperclip = LazyModule("pyperclip")
+urllib_request = LazyModule("urllib.request")
+http_server = LazyModule("http.server")
+asyncio = LazyModule("asyncio")
+osc_server = LazyModule("pythonosc.osc_server")
+osc_dispatcher = LazyModule("pythonosc.dispatcher")
+osc_bundle_builder = LazyModule("pythonosc.osc_bundle_builder")
+osc_message_builder = LazyModule("pythonosc.osc_message_builder")
+sqlite3 = LazyModule("sqlite3")
+
+IMPORTS_DONE = time.perf_counter()
+
+log = logging.getLogger("ELOV")
 
 # Config file location
 CONFIG_DIR = os.path.expanduser("~/.config/ELOV")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "ELOV_config.json")
 ICON_PATH = os.path.join(CONFIG_DIR, "ELOV.png")
 ICON_URL = "https://raw.githubusercontent.com/Voiasis/ELOV/refs/heads/main/ELOV.png"
+BUNDLED_ICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ELOV.png")
+GPU_CACHE_FILE = os.path.join(CONFIG_DIR, "gpu_cache.json")
+METRICS_FILE = os.path.join(CONFIG_DIR, "metrics.json")
+CHAT_DB_FILE = os.path.join(CONFIG_DIR, "chat_history.db")
+
+# Default settings; the Tk variables, saved JSON and ConfigSnapshot all follow this layout
+CONFIG_DEFAULTS = {
+    "system_stats": {
+        "enable": True,
+        "cpu_usage": True,
+        "cpu_smoothing": False,
+        "cpu_max_core": False,
+        "show_average": False,
+        "average_window": "60",
+        "cpu_temp": False,
+        "gpu_usage": True,
+        "gpu_temp": False,
+        "vrchat_gpu": False,
+        "ram_usage": False,
+        "vram_usage": False,
+        "temp_unit": "C",
+        "gpu_display": "primary",
+        "gpu_selected": "",
+        "primary_gpu": "auto",
+    },
+    "time": {
+        "enable": True,
+        "prefix": True,
+        "timezone": False,
+        "short_tz": False,
+        "24hour": False,
+    },
+    "music": {
+        "enable": True,
+        "progress": False,
+        "prefix": "emoji",
+    },
+    "skinny_mode": True,
+    "app": {
+        "ip": "127.0.0.1",
+        "port": "9000",
+        "send_interval": "1.5",
+        "send_burst": "3",
+        "update_period": "2",
+        "metrics_port": "",
+        "destinations": "",
+    },
+    "osc_input": {
+        "enable": False,
+        "port": "9001",
+        "pause_on": "AFK",
+    },
+    "avatar_output": {
+        "enable": False,
+        "rate": "10",
+        "mapping": "cpu_usage=ELOV_CPU, gpu_usage=ELOV_GPU, cpu_temp=ELOV_CPUTemp, gpu_temp=ELOV_GPUTemp, ram_used=ELOV_RAM, vram_used=ELOV_VRAM",
+    },
+    "chat_timeout": "5",
+    "template": "",
+}
+
+# Flat ConfigSnapshot attribute -> (section, key); section None is a top-level setting
+SNAPSHOT_FIELDS = {
+    "system_enable": ("system_stats", "enable"),
+    "cpu_usage": ("system_stats", "cpu_usage"),
+    "cpu_smoothing": ("system_stats", "cpu_smoothing"),
+    "cpu_max_core": ("system_stats", "cpu_max_core"),
+    "show_average": ("system_stats", "show_average"),
+    "average_window": ("system_stats", "average_window"),
+    "cpu_temp": ("system_stats", "cpu_temp"),
+    "gpu_usage": ("system_stats", "gpu_usage"),
+    "gpu_temp": ("system_stats", "gpu_temp"),
+    "vrchat_gpu": ("system_stats", "vrchat_gpu"),
+    "ram_usage": ("system_stats", "ram_usage"),
+    "vram_usage": ("system_stats", "vram_usage"),
+    "temp_unit": ("system_stats", "temp_unit"),
+    "gpu_display": ("system_stats", "gpu_display"),
+    "gpu_selected": ("system_stats", "gpu_selected"),
+    "primary_gpu": ("system_stats", "primary_gpu"),
+    "time_enable": ("time", "enable"),
+    "time_prefix": ("time", "prefix"),
+    "time_timezone": ("time", "timezone"),
+    "time_short_tz": ("time", "short_tz"),
+    "time_24hour": ("time", "24hour"),
+    "music_enable": ("music", "enable"),
+    "music_progress": ("music", "progress"),
+    "music_prefix": ("music", "prefix"),
+    "skinny_mode": (None, "skinny_mode"),
+    "ip": ("app", "ip"),
+    "port": ("app", "port"),
+    "send_interval": ("app", "send_interval"),
+    "send_burst": ("app", "send_burst"),
+    "update_period": ("app", "update_period"),
+    "metrics_port": ("app", "metrics_port"),
+    "destinations": ("app", "destinations"),
+    "osc_input_enable": ("osc_input", "enable"),
+    "osc_input_port": ("osc_input", "port"),
+    "pause_on": ("osc_input", "pause_on"),
+    "avatar_enable": ("avatar_output", "enable"),
+    "avatar_rate": ("avatar_output", "rate"),
+    "avatar_mapping": ("avatar_output", "mapping"),
+    "chat_timeout": (None, "chat_timeout"),
+    "template": (None, "template"),
+}
+
+# Stats flags that gate sampling; ConfigSnapshot.sampled holds the ones in effect
+SAMPLE_FLAGS = ("cpu_usage", "cpu_temp", "gpu_usage", "gpu_temp", "vrchat_gpu", "ram_usage", "vram_usage")
+
+@lru_cache(maxsize=16)
+def parse_port(text, default):
+    """Parse a UDP port, falling back to default (with one warning per bad value)."""
+    try:
+        port = int(text)
+        if not 0 < port < 65536:
+            raise ValueError
+    except ValueError:
+        log.warning(f"Invalid port {text!r}; using {default}")
+        return default
+    return port
+
+def optional_port(value):
+    """Return value as a port number, or None if it is empty; raise ValueError if it is not a valid port."""
+    if not value:
+        return None
+    port = int(value)
+    if not 0 < port < 65536:
+        raise ValueError(f"port {port} is outside 1-65535")
+    return port
+
+class ConfigSnapshot:
+    """Immutable, flattened copy of the settings that worker threads read every tick.
+
+    Built from a plain config dict whenever a setting changes, so the workers
+    never call into Tk. Values that need parsing are compiled here once.
+    """
+
+    __slots__ = tuple(SNAPSHOT_FIELDS) + ("suffix", "renderer", "sampled", "avatar_providers")
+
+    def __init__(self, data):
+        for name, (section, key) in SNAPSHOT_FIELDS.items():
+            source = data if section is None else data.get(section, {})
+            defaults = CONFIG_DEFAULTS if section is None else CONFIG_DEFAULTS[section]
+            object.__setattr__(self, name, source.get(key, defaults[key]))
+        try:
+            chat_timeout = float(self.chat_timeout)
+        except ValueError:
+            chat_timeout = 5.0
+        object.__setattr__(self, "chat_timeout", chat_timeout)
+        object.__setattr__(self, "port", parse_port(self.port, int(CONFIG_DEFAULTS["app"]["port"])))
+        try:
+            update_period = min(max(float(self.update_period), MIN_UPDATE_PERIOD), MAX_UPDATE_PERIOD)
+        except ValueError:
+            update_period = 2.0
+        object.__setattr__(self, "update_period", update_period)
+        try:
+            average_window = max(float(self.average_window), 1.0)
+        except ValueError:
+            average_window = 60.0
+        object.__setattr__(self, "average_window", average_window)
+        selected = tuple(bus.strip() for bus in self.gpu_selected.split(",") if bus.strip())
+        object.__setattr__(self, "gpu_selected", selected)
+        pause_on = tuple(name.strip() for name in self.pause_on.split(",") if name.strip())
+        object.__setattr__(self, "pause_on", pause_on)
+        try:
+            avatar_rate = min(max(float(self.avatar_rate), 0.5), 50.0)
+        except ValueError:
+            avatar_rate = 10.0
+        object.__setattr__(self, "avatar_rate", avatar_rate)
+        object.__setattr__(self, "avatar_mapping", parse_avatar_mapping(self.avatar_mapping))
+        # Stats flags to sample: those shown in the chatbox plus those feeding avatar parameters
+        sampled = {flag for flag in SAMPLE_FLAGS if getattr(self, flag)}
+        sources = [METRIC_SOURCES[m.metric] for m in self.avatar_mapping] if self.avatar_enable else []
+        sampled.update(flag for _provider, flag in sources)
+        object.__setattr__(self, "sampled", frozenset(sampled))
+        object.__setattr__(self, "avatar_providers", frozenset(provider for provider, _flag in sources))
+        object.__setattr__(self, "suffix", "\u0003\u001f" if self.skinny_mode else "")
+        object.__setattr__(self, "renderer", compile_template(self.template))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("ConfigSnapshot is read-only")
+
+def config_to_dict(config):
+    """Read a nested dict of Tk variables into a plain dict."""
+    return {
+        key: config_to_dict(value) if isinstance(value, dict) else value.get()
+        for key, value in config.items()
+    }
+
+# Warn when the first OSC message takes longer than this after launch (seconds)
+STARTUP_BUDGET = 1.0
+
+class StartupProfiler:
+    """Record how long each startup phase takes, up to the first OSC message."""
+
+    def __init__(self):
+        self.enabled = False
+        self.phases = [("imports", IMPORTS_DONE - STARTUP_T0)]
+        self.first_message_at = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def first_message(self):
+        """Mark the first OSC message and print the report if profiling is on."""
+        if self.first_message_at is not None:
+            return
+        self.first_message_at = time.perf_counter() - STARTUP_T0
+        if self.enabled:
+            self.report()
+
+    def report(self):
+        print("Startup profile:")
+        for name, elapsed in self.phases:
+            print(f"  {name:<24} {elapsed * 1000:8.1f} ms")
+        if self.first_message_at is not None:
+            total = self.first_message_at
+            print(f"  {'first OSC message':<24} {total * 1000:8.1f} ms after launch")
+            if total > STARTUP_BUDGET:
+                print(f"  Over the {STARTUP_BUDGET:.1f}s startup budget by {(total - STARTUP_BUDGET) * 1000:.0f} ms")
+
+startup_profiler = StartupProfiler()
+
+# Upper bounds (seconds) of the latency histogram buckets; one more bucket catches anything slower
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with error and timeout counters for one stage."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.errors = 0
+        self.timeouts = 0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(LATENCY_BUCKETS[index], self.max) if index < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "last": self.last,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+class HotPathMetrics:
+    """Per-stage latency histograms for the send loop (providers, build, send, preview)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+
+    def histogram(self, name):
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = LatencyHistogram()
+        return histogram
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block; an exception counts as an error and is re-raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.observe(name, time.perf_counter() - start, error=True)
+            raise
+        self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds, error=False, timeout=False):
+        with self.lock:
+            histogram = self.histogram(name)
+            histogram.observe(seconds)
+            histogram.errors += error
+            histogram.timeouts += timeout
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.stages.items())}
+
+    def counter_snapshot(self):
+        with self.lock:
+            return dict(sorted(self.counters.items()))
+
+    def report(self):
+        """Render the stage table shown in the Diagnostics tab."""
+        lines = [f"{'stage':<26}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'err':>6}{'t/o':>6}"]
+        for name, stats in self.snapshot().items():
+            lines.append(
+                f"{name:<26}{stats['count']:>7}"
+                f"{stats['p50'] * 1000:>9.1f}{stats['p95'] * 1000:>9.1f}{stats['max'] * 1000:>9.1f}"
+                f"{stats['errors']:>6}{stats['timeouts']:>6}"
+            )
+        counters = self.counter_snapshot()
+        if counters:
+            lines.append("")
+            lines.extend(f"{name:<26}{value:>7}" for name, value in counters.items())
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump({"time": time.time(), "stages": self.snapshot(), "counters": self.counter_snapshot()}, f, indent=4)
+
+hot_path_metrics = HotPathMetrics()
+
+# Accepted range for the chatbox update period, in seconds
+MIN_UPDATE_PERIOD = 0.5
+MAX_UPDATE_PERIOD = 60.0
+
+class TickClock:
+    """Fixed-rate ticks on time.monotonic() aimed at absolute deadlines.
+
+    Deadlines sit on a grid of start + n * period, so the time spent working
+    does not stretch the period and wall-clock jumps do not move it. A tick
+    that runs past the next deadline skips every deadline it missed and waits
+    for the next grid point instead of firing the missed ones back to back.
+    Lateness of each wake-up goes to the "<name>_jitter" stage; overruns and
+    skipped ticks go to counters of the same prefix.
+    """
 
-# Cache for primary GPU
-primary_gpu_cache = None
+    def __init__(self, period, name="tick"):
+        self.period = period
+        self.name = name
+        self.deadline = time.monotonic()
+
+    def wait(self, period=None):
+        """Sleep until the next deadline; a new period takes effect from the current one."""
+        if period:
+            self.period = period
+        now = time.monotonic()
+        missed = int((now - self.deadline) // self.period)
+        if missed >= 1:
+            hot_path_metrics.count(f"{self.name}_overruns")
+            hot_path_metrics.count(f"{self.name}_skipped", missed)
+            log.debug("Tick overran by %.2fs; skipping %d", now - self.deadline - self.period, missed)
+        else:
+            missed = 0
+        deadline = self.deadline + (missed + 1) * self.period
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        hot_path_metrics.observe(f"{self.name}_jitter", max(time.monotonic() - deadline, 0.0))
+        hot_path_metrics.count(f"{self.name}s")
+        self.deadline = deadline
+
+# Root of the sysfs and procfs trees; point ELOV_SYSFS_ROOT/ELOV_PROC_ROOT at fixture trees for testing
+SYSFS_ROOT = os.environ.get("ELOV_SYSFS_ROOT", "/sys")
+PROC_ROOT = os.environ.get("ELOV_PROC_ROOT", "/proc")
+
+PCI_VENDORS = {
+    "0x1002": "amd",
+    "0x10de": "nvidia",
+    "0x8086": "intel",
+}
+PCI_DISPLAY_CLASSES = {
+    "00": "VGA compatible controller",
+    "02": "3D controller",
+    "80": "Display controller",
+}
+
+def sysfs_path(*parts):
+    """Build a path under the sysfs root (ELOV_SYSFS_ROOT, /sys by default)."""
+    return os.path.join(SYSFS_ROOT, *parts)
+
+def read_sysfs_attr(path):
+    """Read a small sysfs attribute, returning None if it is missing."""
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except (IOError, FileNotFoundError):
+        return None
 
 def get_gpu_info():
-    """Detect all GPUs and map to DRM cards."""
+    """Detect all display-class PCI devices and map each to its DRM card."""
+    gpus = []
+    devices_dir = sysfs_path("bus", "pci", "devices")
     try:
-        lspci = subprocess.run(
-            ["lspci", "-nn"], capture_output=True, text=True, check=True
-        )
-        gpus = []
-        for line in lspci.stdout.splitlines():
-            if "VGA" in line or "3D" in line:
-                bus_id = line.split()[0]
-                name = line.lower()
-                gpu_type = None
-                if "amd" in name or "ati" in name:
-                    gpu_type = "amd"
-                elif "nvidia" in name:
-                    gpu_type = "nvidia"
-                elif "intel" in name:
-                    gpu_type = "intel"
-                if gpu_type:
-                    card = None
-                    for drm_card in glob.glob("/sys/class/drm/card[0-9]*"):
-                        try:
-                            with open(os.path.join(drm_card, "device", "uevent"), "r") as f:
-                                uevent = f.read()
-                                if bus_id in uevent:
-                                    card = os.path.basename(drm_card)
-                                    break
-                        except (IOError, FileNotFoundError):
-                            continue
-                    gpus.append({
-                        "bus_id": bus_id,
-                        "type": gpu_type,
-                        "name": line,
-                        "card": card
-                    })
+        devices = sorted(os.listdir(devices_dir))
+    except OSError as e:
+        log.warning(f"Error listing GPUs: {e}")
         return gpus
-    except subprocess.SubprocessError as e:
-        print(f"Error listing GPUs: {e}")
-        return []
+    for address in devices:
+        device_dir = os.path.join(devices_dir, address)
+        pci_class = read_sysfs_attr(os.path.join(device_dir, "class"))
+        if not pci_class or not pci_class.startswith("0x03"):
+            continue
+        vendor = read_sysfs_attr(os.path.join(device_dir, "vendor")) or ""
+        gpu_type = PCI_VENDORS.get(vendor)
+        if not gpu_type:
+            continue
+        device = read_sysfs_attr(os.path.join(device_dir, "device")) or "0x0000"
+        card = None
+        try:
+            for entry in sorted(os.listdir(os.path.join(device_dir, "drm"))):
+                if re.fullmatch(r"card[0-9]+", entry):
+                    card = entry
+                    break
+        except OSError:
+            pass
+        # lspci omits the default 0000 PCI domain
+        bus_id = address[5:] if address.startswith("0000:") else address
+        class_name = PCI_DISPLAY_CLASSES.get(pci_class[4:6], "Display controller")
+        gpus.append({
+            "bus_id": bus_id,
+            "type": gpu_type,
+            "name": f"{bus_id} {class_name} [{pci_class[2:6]}]: {gpu_type.upper()} [{vendor[2:]}:{device[2:]}]",
+            "card": card
+        })
+    return gpus
 
-def get_primary_gpu_xrandr():
+def get_primary_gpu_xrandr(gpus=None):
     """Identify the GPU connected to the primary monitor."""
     try:
         xrandr = subprocess.run(
@@ -81,10 +523,10 @@ def get_primary_gpu_xrandr():
                 primary_output = line.split()[0]
                 break
         if not primary_output:
-            print("No primary output detected")
+            log.warning("No primary output detected")
             return None
 
-        drm_cards = glob.glob("/sys/class/drm/card[0-9]*")
+        drm_cards = glob.glob(sysfs_path("class", "drm", "card[0-9]*"))
         primary_bus_id = None
         for card in drm_cards:
             try:
@@ -93,31 +535,36 @@ def get_primary_gpu_xrandr():
                     bus_id_match = re.search(r"PCI_SLOT_NAME=0000:([0-9a-f:.]+)", uevent)
                     if bus_id_match:
                         bus_id = bus_id_match.group(1)
-                        output_path = os.path.join(os.path.dirname(card), primary_output)
-                        if os.path.exists(output_path):
+                        # Connectors are named <card>-<output> (card1-DP-1); also accept a bare name
+                        output_paths = (f"{card}-{primary_output}",
+                                        os.path.join(os.path.dirname(card), primary_output))
+                        if any(os.path.exists(path) for path in output_paths):
                             primary_bus_id = bus_id
                             break
             except (IOError, FileNotFoundError):
                 continue
 
         if not primary_bus_id:
-            print("Could not map primary output to GPU")
+            log.warning("Could not map primary output to GPU")
             return None
 
-        gpus = get_gpu_info()
+        if gpus is None:
+            gpus = get_gpu_info()
         for gpu in gpus:
             if gpu["bus_id"] == primary_bus_id:
-                print(f"Primary GPU (xrandr): {gpu['type']} at {gpu['bus_id']} ({gpu['card']})")
+                log.info(f"Primary GPU (xrandr): {gpu['type']} at {gpu['bus_id']} ({gpu['card']})")
                 return gpu
-        print(f"No GPU found for bus ID {primary_bus_id}")
+        log.warning(f"No GPU found for bus ID {primary_bus_id}")
         return None
-    except subprocess.SubprocessError as e:
-        print(f"xrandr error: {e}")
+    except (subprocess.SubprocessError, FileNotFoundError) as e:
+        log.warning(f"xrandr error: {e}")
         return None
 
-def get_rendering_gpu():
+def get_rendering_gpu(gpus=None):
     """Identify the GPU used for rendering (via glxinfo)."""
     try:
+        if gpus is None:
+            gpus = get_gpu_info()
         for dri_prime in ["1", "0"]:
             env = os.environ.copy()
             env["DRI_PRIME"] = dri_prime
@@ -130,303 +577,2883 @@ def get_rendering_gpu():
                     renderer = line.lower()
                     break
             if renderer:
-                gpus = get_gpu_info()
                 if "amd" in renderer or "radeon" in renderer:
                     for gpu in gpus:
                         if gpu["type"] == "amd":
-                            print(f"Rendering GPU (DRI_PRIME={dri_prime}): AMD at {gpu['bus_id']} ({gpu['card']})")
+                            log.info(f"Rendering GPU (DRI_PRIME={dri_prime}): AMD at {gpu['bus_id']} ({gpu['card']})")
                             return gpu
                 elif "nvidia" in renderer:
                     for gpu in gpus:
                         if gpu["type"] == "nvidia":
-                            print(f"Rendering GPU (DRI_PRIME={dri_prime}): NVIDIA at {gpu['bus_id']} ({gpu['card']})")
+                            log.info(f"Rendering GPU (DRI_PRIME={dri_prime}): NVIDIA at {gpu['bus_id']} ({gpu['card']})")
                             return gpu
                 elif "intel" in renderer:
                     for gpu in gpus:
                         if gpu["type"] == "intel":
-                            print(f"Rendering GPU (DRI_PRIME={dri_prime}): Intel at {gpu['bus_id']} ({gpu['card']})")
+                            log.info(f"Rendering GPU (DRI_PRIME={dri_prime}): Intel at {gpu['bus_id']} ({gpu['card']})")
                             return gpu
-        print(f"No GPU matched for renderer: {renderer}")
+        log.warning(f"No GPU matched for renderer: {renderer}")
         return None
-    except subprocess.SubprocessError as e:
-        print(f"glxinfo error: {e}")
+    except (subprocess.SubprocessError, FileNotFoundError) as e:
+        log.warning(f"glxinfo error: {e}")
         return None
 
-def select_primary_gpu():
-    """Select the primary GPU and cache it."""
-    global primary_gpu_cache
-    if primary_gpu_cache:
-        return primary_gpu_cache
-
-    gpus = get_gpu_info()
+def choose_primary_gpu(gpus):
+    """Pick the primary GPU: the one driving the primary monitor, then the renderer, then the first busy one."""
     if not gpus:
-        print("No GPUs detected")
+        log.warning("No GPUs detected")
+        return None
+
+    primary_gpu = get_primary_gpu_xrandr(gpus)
+    if primary_gpu and primary_gpu["card"]:
+        usage = get_gpu_usage_by_type(primary_gpu)
+        if usage > 0:
+            return primary_gpu
+
+    rendering_gpu = get_rendering_gpu(gpus)
+    if rendering_gpu and rendering_gpu["card"]:
+        usage = get_gpu_usage_by_type(rendering_gpu)
+        if usage > 0:
+            return rendering_gpu
+
+    for gpu in gpus:
+        if gpu["card"]:
+            usage = get_gpu_usage_by_type(gpu)
+            if usage > 0:
+                return gpu
+
+    log.info(f"Defaulting to first GPU: {gpus[0]['type']} at {gpus[0]['bus_id']} ({gpus[0]['card']})")
+    return gpus[0]
+
+# Primary GPU overrides already reported as missing, so each is logged once
+missing_primary_gpus = set()
+
+def pick_primary_gpu(gpus, detected, override="auto"):
+    """Return the user's chosen primary GPU (by bus ID), or the detected one for "auto"."""
+    if override and override != "auto":
+        for gpu in gpus:
+            if gpu["bus_id"] == override:
+                return gpu
+        if override not in missing_primary_gpus:
+            missing_primary_gpus.add(override)
+            log.warning(f"Primary GPU {override} not found; using detected GPU")
+    return detected
+
+def pci_fingerprint():
+    """Hash the PCI device list (addresses, IDs, DRM nodes and drivers) to detect hardware changes."""
+    digest = hashlib.sha1()
+    root = sysfs_path("bus", "pci", "devices")
+    try:
+        devices = sorted(os.listdir(root))
+    except OSError:
         return None
+    for device in devices:
+        digest.update(device.encode())
+        for attr in ("class", "vendor", "device"):
+            try:
+                with open(os.path.join(root, device, attr), "rb") as f:
+                    digest.update(f.read())
+            except OSError:
+                continue
+        try:
+            digest.update(" ".join(sorted(os.listdir(os.path.join(root, device, "drm")))).encode())
+        except OSError:
+            pass
+        try:
+            digest.update(os.path.basename(os.readlink(os.path.join(root, device, "driver"))).encode())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+def load_gpu_cache(fingerprint):
+    """Return cached (gpus, primary) if it was saved for this fingerprint."""
+    try:
+        with open(GPU_CACHE_FILE, "r") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not fingerprint or not isinstance(data, dict) or data.get("fingerprint") != fingerprint:
+        return None
+    gpus = data.get("gpus")
+    if not isinstance(gpus, list) or not all(
+        isinstance(gpu, dict) and isinstance(gpu.get("bus_id"), str) and "type" in gpu for gpu in gpus
+    ):
+        log.warning("Ignoring malformed GPU cache")
+        return None
+    primary = next((gpu for gpu in gpus if gpu["bus_id"] == data.get("primary")), None)
+    return gpus, primary
+
+def save_gpu_cache(fingerprint, gpus, primary):
+    """Store the detected GPU topology and primary GPU in CONFIG_DIR."""
+    data = {
+        "fingerprint": fingerprint,
+        "gpus": gpus,
+        "primary": primary["bus_id"] if primary else None,
+    }
+    try:
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        with open(GPU_CACHE_FILE, "w") as f:
+            json.dump(data, f, indent=4)
+    except OSError as e:
+        log.warning(f"GPU cache save error: {e}")
+
+# Detected (gpus, primary) for this run, and callbacks for when a re-check changes it
+gpu_topology = None
+gpu_topology_listeners = []
+gpu_topology_lock = threading.Lock()
+
+def get_gpu_topology():
+    """Return (gpus, primary), from the on-disk cache when the hardware is unchanged.
+
+    A cache hit is returned immediately and re-checked on a background thread.
+    """
+    global gpu_topology
+    if gpu_topology is not None:
+        return gpu_topology
+    fingerprint = pci_fingerprint()
+    cached = load_gpu_cache(fingerprint)
+    if cached is None:
+        return refresh_gpu_topology(fingerprint)
+    gpu_topology = cached
+    log.info("Loaded GPU topology from cache")
+    threading.Thread(target=refresh_gpu_topology, args=(fingerprint,), daemon=True).start()
+    return gpu_topology
+
+def refresh_gpu_topology(fingerprint=None):
+    """Detect GPUs and the primary GPU from scratch and update the cache."""
+    global gpu_topology
+    gpus = get_gpu_info()
+    primary = choose_primary_gpu(gpus)
+    save_gpu_cache(fingerprint or pci_fingerprint(), gpus, primary)
+    with gpu_topology_lock:
+        changed = gpu_topology is not None and gpu_topology != (gpus, primary)
+        gpu_topology = (gpus, primary)
+        if changed:
+            log.info("GPU topology changed since it was cached")
+            with sysfs_samplers_lock:
+                sysfs_samplers.clear()  # card paths may have moved
+            for listener in gpu_topology_listeners:
+                listener(gpus, primary)
+    return gpu_topology
+
+def watch_gpu_topology(listener):
+    """Call listener(gpus, primary) with the current topology now and again whenever a re-check changes it.
+
+    Registration and the first call happen under the same lock the re-check
+    notifies under, so a result that lands during startup is never missed.
+    """
+    get_gpu_topology()
+    with gpu_topology_lock:
+        gpu_topology_listeners.append(listener)
+        listener(*gpu_topology)
+
+
+SensorSnapshot = namedtuple(
+    "SensorSnapshot", ["cpu_temp", "gpu_busy", "gpu_temp", "vram_used", "vram_total"]
+)
+
+def find_cpu_temp_input():
+    """Find the hwmon input for the CPU package (coretemp) or Tctl (k10temp) sensor."""
+    for hwmon in sorted(glob.glob(sysfs_path("class", "hwmon", "hwmon[0-9]*"))):
+        try:
+            with open(os.path.join(hwmon, "name"), "r") as f:
+                name = f.read().strip()
+        except (IOError, FileNotFoundError):
+            continue
+        if name not in ("coretemp", "k10temp"):
+            continue
+        for label_path in sorted(glob.glob(os.path.join(hwmon, "temp*_label"))):
+            try:
+                with open(label_path, "r") as f:
+                    label = f.read().strip()
+            except (IOError, FileNotFoundError):
+                continue
+            if "Package" in label or "Tctl" in label:
+                return label_path[:-len("_label")] + "_input"
+        if os.path.exists(os.path.join(hwmon, "temp1_input")):
+            return os.path.join(hwmon, "temp1_input")
+    return None
+
+class SysfsSampler:
+    """Resolve sysfs/hwmon paths once and re-read them through open file descriptors.
+
+    A sampler for a GPU tracks that card's busy/temp/VRAM files; the sampler
+    for gpu=None tracks the CPU package sensor.
+    """
+
+    def __init__(self, gpu):
+        self.gpu = gpu
+        self.fds = {}
+        self.vram_total = None
+        card = gpu.get("card") if gpu else None
+        if gpu is None:
+            cpu_temp = find_cpu_temp_input()
+            if cpu_temp:
+                self._open("cpu_temp", cpu_temp)
+        elif card:
+            device = sysfs_path("class", "drm", card, "device")
+            self._open("gpu_busy", os.path.join(device, "gpu_busy_percent"))
+            self._open("vram_used", os.path.join(device, "mem_info_vram_used"))
+            temp_file = sorted(glob.glob(os.path.join(device, "hwmon", "*", "temp1_input")))
+            if temp_file:
+                self._open("gpu_temp", temp_file[0])
+            # Total VRAM never changes, so read it once instead of every tick
+            self._open("vram_total", os.path.join(device, "mem_info_vram_total"))
+            self.vram_total = self.read("vram_total")
+            self.close("vram_total")
+        log.info(f"Sysfs sampler resolved: {', '.join(sorted(self.fds)) or 'nothing'}")
+
+    def _open(self, name, path):
+        try:
+            self.fds[name] = os.open(path, os.O_RDONLY)
+        except OSError:
+            pass
+
+    def has(self, name):
+        return name in self.fds or (name == "vram_total" and self.vram_total is not None)
+
+    def read(self, name):
+        """Re-read a sysfs attribute from offset 0 of its open descriptor."""
+        fd = self.fds.get(name)
+        if fd is None:
+            return None
+        try:
+            return int(os.pread(fd, 64, 0).strip())
+        except (OSError, ValueError) as e:
+            log.debug("sysfs read error for %s: %s", name, e)
+            return None
+
+    def snapshot(self):
+        """Read every resolved sensor once."""
+        cpu_temp = self.read("cpu_temp")
+        gpu_busy = self.read("gpu_busy")
+        gpu_temp = self.read("gpu_temp")
+        vram_used = self.read("vram_used")
+        return SensorSnapshot(
+            cpu_temp=cpu_temp / 1000.0 if cpu_temp is not None else None,
+            gpu_busy=float(gpu_busy) if gpu_busy is not None else None,
+            gpu_temp=gpu_temp / 1000.0 if gpu_temp is not None else None,
+            vram_used=vram_used / 1024**3 if vram_used is not None else None,
+            vram_total=self.vram_total / 1024**3 if self.vram_total is not None else None,
+        )
+
+    def close(self, name=None):
+        """Close one descriptor, or all of them."""
+        names = [name] if name else list(self.fds)
+        for key in names:
+            fd = self.fds.pop(key, None)
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+CpuSample = namedtuple("CpuSample", ["usage", "smoothed", "cores", "ccds", "max_core"])
+
+def read_ccd_groups(cpu_count):
+    """Group logical CPUs by the L3 cache they share (one group per CCD/CCX)."""
+    groups = {}
+    for cpu in range(cpu_count):
+        try:
+            with open(sysfs_path("devices", "system", "cpu", f"cpu{cpu}", "cache", "index3", "shared_cpu_list"), "r") as f:
+                key = f.read().strip()
+        except (IOError, FileNotFoundError):
+            key = "all"
+        groups.setdefault(key, []).append(cpu)
+    return list(groups.values())
+
+class CpuSampler:
+    """Compute CPU usage from /proc/stat counter deltas between calls, without sleeping.
+
+    alpha is the smoothing weight of one second's worth of samples, so the
+    smoothed value keeps the same time constant however often it is sampled.
+    """
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.prev = None
+        self.stamp = None
+        self.smoothed = None
+        self.ccds = None
+
+    def read_counters(self):
+        """Return (busy, total) jiffies for the whole CPU and for each core."""
+        counters = []
+        with open(os.path.join(PROC_ROOT, "stat"), "r") as f:
+            for line in f:
+                if not line.startswith("cpu"):
+                    break
+                fields = line.split()
+                # user nice system idle iowait irq softirq steal; guest time is already in user
+                values = [int(v) for v in fields[1:9]]
+                total = sum(values)
+                idle = values[3] + values[4]
+                counters.append((total - idle, total))
+        return counters
+
+    def sample(self):
+        """Return a CpuSample with usage since the previous call."""
+        with self.lock:
+            counters = self.read_counters()
+            prev = self.prev or [(0, 0)] * len(counters)
+            if len(prev) != len(counters):
+                prev = [(0, 0)] * len(counters)
+            self.prev = counters
+            deltas = [
+                (busy - p_busy, total - p_total)
+                for (busy, total), (p_busy, p_total) in zip(counters, prev)
+            ]
+            usage = self.percent(*deltas[0])
+            cores = [self.percent(busy, total) for busy, total in deltas[1:]]
+            if self.ccds is None:
+                self.ccds = read_ccd_groups(len(cores))
+            ccds = []
+            for group in self.ccds:
+                busy = sum(deltas[cpu + 1][0] for cpu in group if cpu < len(cores))
+                total = sum(deltas[cpu + 1][1] for cpu in group if cpu < len(cores))
+                ccds.append(self.percent(busy, total))
+            now = time.monotonic()
+            if self.smoothed is None:
+                self.smoothed = usage
+            else:
+                alpha = 1.0 - (1.0 - self.alpha) ** min(now - self.stamp, 1.0)
+                self.smoothed += alpha * (usage - self.smoothed)
+            self.stamp = now
+            return CpuSample(
+                usage=usage,
+                smoothed=self.smoothed,
+                cores=cores,
+                ccds=ccds,
+                max_core=max(cores) if cores else usage,
+            )
+
+    @staticmethod
+    def percent(busy, total):
+        return round(100.0 * busy / total, 1) if total > 0 else 0.0
+
+cpu_sampler = CpuSampler()
+
+# Samplers keyed by bus ID (None for the CPU), so paths are resolved only once
+sysfs_samplers = {}
+sysfs_samplers_lock = threading.Lock()
+
+def get_sysfs_sampler(gpu):
+    """Return the cached sysfs sampler for a GPU (or the CPU for None), creating it on first use."""
+    key = gpu["bus_id"] if gpu else None
+    with sysfs_samplers_lock:
+        sampler = sysfs_samplers.get(key)
+        if sampler is None:
+            sampler = SysfsSampler(gpu)
+            sysfs_samplers[key] = sampler
+        return sampler
+
+def get_cpu_stats(config):
+    """Get CPU usage stats based on config."""
+    stats = {}
+    if "cpu_usage" in config.sampled:
+        try:
+            cpu = cpu_sampler.sample()
+            stats["cpu_usage"] = cpu.smoothed if config.cpu_smoothing else cpu.usage
+            stats["cpu_cores"] = cpu.cores
+            stats["cpu_ccds"] = cpu.ccds
+            stats["cpu_max_core"] = cpu.max_core
+        except (IOError, ValueError) as e:
+            log.warning(f"CPU usage error: {e}")
+            stats["cpu_usage"] = 0.0
+    return stats
+
+def normalize_bus_id(bus_id):
+    """Normalize a PCI address (e.g. nvidia-smi's 00000000:01:00.0) to the lspci-style form."""
+    parts = bus_id.strip().lower().split(":")
+    if len(parts) == 3:
+        domain = int(parts[0], 16)
+        rest = f"{parts[1][-2:]}:{parts[2]}"
+        return rest if domain == 0 else f"{domain:04x}:{rest}"
+    return bus_id.strip().lower()
+
+NvidiaSample = namedtuple("NvidiaSample", ["usage", "temp", "vram_used", "vram_total", "power", "clock", "stamp"])
+
+class NvidiaSmiMonitor:
+    """Keep one `nvidia-smi --query-gpu ... -lms N` process running and parse its stream.
+
+    A reader thread turns each CSV line into an NvidiaSample keyed by bus ID;
+    the process is restarted with backoff if it exits.
+    """
+
+    QUERY = "pci.bus_id,utilization.gpu,temperature.gpu,memory.used,memory.total,power.draw,clocks.gr"
+
+    def __init__(self, interval_ms=1000, command="nvidia-smi"):
+        self.interval_ms = interval_ms
+        self.command = command
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.running = False
+        self.process = None
+        self.ready = threading.Event()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        threading.Thread(target=self.run, name="nvidia-smi", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def run(self):
+        backoff = 1.0
+        while self.running:
+            try:
+                self.process = subprocess.Popen(
+                    [self.command, f"--query-gpu={self.QUERY}",
+                     "--format=csv,noheader,nounits", "-lms", str(self.interval_ms)],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    bufsize=1,
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                log.warning(f"nvidia-smi error: {e}")
+                self.ready.set()
+                return
+            for line in self.process.stdout:
+                if self.parse_line(line):
+                    backoff = 1.0
+                    self.ready.set()
+            self.process.wait()
+            self.ready.set()  # don't make callers wait on a process that keeps failing
+            if self.running:
+                log.warning(f"nvidia-smi exited ({self.process.returncode}); restarting in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    @staticmethod
+    def parse_value(text):
+        try:
+            return float(text)
+        except ValueError:
+            return None  # [N/A], [Not Supported]
+
+    def parse_line(self, line):
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) != 7:
+            return False
+        values = [self.parse_value(field) for field in fields[1:]]
+        sample = NvidiaSample(*values, stamp=time.monotonic())
+        with self.lock:
+            self.samples[normalize_bus_id(fields[0])] = sample
+        return True
+
+    def get(self, bus_id):
+        """Return the latest sample for a GPU, or None if there is no recent one."""
+        with self.lock:
+            sample = self.samples.get(bus_id)
+        max_age = max(5 * self.interval_ms / 1000.0, 5.0)
+        if sample is None or time.monotonic() - sample.stamp > max_age:
+            return None
+        return sample
+
+# Started on first use, only when an NVIDIA GPU is present
+nvidia_monitor = None
+nvidia_monitor_lock = threading.Lock()
+
+def get_nvidia_monitor():
+    global nvidia_monitor
+    with nvidia_monitor_lock:
+        started = nvidia_monitor is None
+        if started:
+            nvidia_monitor = NvidiaSmiMonitor()
+            nvidia_monitor.start()
+        monitor = nvidia_monitor
+    if started:
+        monitor.ready.wait(2.0)  # let the first call see the first sample
+    return monitor
+
+RadeontopSample = namedtuple(
+    "RadeontopSample",
+    ["usage", "vram_percent", "vram_mb", "gtt_percent", "gtt_mb", "sclk_ghz", "mclk_ghz", "blocks", "stamp"]
+)
+
+class RadeontopMonitor:
+    """Keep one `radeontop -d -` process per GPU running and parse its continuous dump.
+
+    Each dump line (gpu, ee, vgt, ..., vram, gtt, mclk, sclk) becomes a
+    RadeontopSample. The process is supervised and restarted with backoff.
+    """
+
+    BLOCK_RE = re.compile(r"(\w+) ([\d.]+)%(?: ([\d.]+)(mb|ghz))?")
+
+    def __init__(self, bus_id=None, command="radeontop"):
+        self.bus_id = bus_id
+        self.command = command
+        self.lock = threading.Lock()
+        self.sample = None
+        self.running = False
+        self.process = None
+        self.warned = False
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        threading.Thread(target=self.run, name="radeontop", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def run(self):
+        cmd = [self.command, "-d", "-", "-i", "1"]
+        if self.bus_id:
+            cmd += ["-b", self.bus_id.split(":")[-2]]
+        backoff = 1.0
+        while self.running:
+            try:
+                self.process = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                log.warning(f"radeontop error: {e}")
+                return
+            for line in self.process.stdout:
+                if self.parse_line(line):
+                    backoff = 1.0
+                elif not self.warned and ("Permission denied" in line or "root" in line):
+                    self.warned = True
+                    log.info(f"radeontop: {line.strip()}")
+                    log.warning("Permission issue. Run with 'sudo' or add user to 'video' group")
+                    log.warning("E.g., 'sudo usermod -aG video $USER' and log out/in")
+            self.process.wait()
+            if self.running:
+                log.warning(f"radeontop exited ({self.process.returncode}); restarting in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def parse_line(self, line):
+        blocks = {}
+        for name, percent, value, unit in self.BLOCK_RE.findall(line):
+            blocks[name] = (float(percent), float(value) if value else None)
+        if "gpu" not in blocks:
+            return False
+        vram = blocks.get("vram", (None, None))
+        gtt = blocks.get("gtt", (None, None))
+        sample = RadeontopSample(
+            usage=blocks["gpu"][0],
+            vram_percent=vram[0],
+            vram_mb=vram[1],
+            gtt_percent=gtt[0],
+            gtt_mb=gtt[1],
+            sclk_ghz=blocks.get("sclk", (None, None))[1],
+            mclk_ghz=blocks.get("mclk", (None, None))[1],
+            blocks={name: percent for name, (percent, _value) in blocks.items()},
+            stamp=time.monotonic(),
+        )
+        with self.lock:
+            self.sample = sample
+        return True
+
+    def get(self):
+        """Return the latest sample, or None if radeontop has not reported recently."""
+        with self.lock:
+            sample = self.sample
+        if sample is None or time.monotonic() - sample.stamp > 5.0:
+            return None
+        return sample
+
+# One supervised radeontop per AMD GPU that needs it, started on first use
+radeontop_monitors = {}
+radeontop_monitors_lock = threading.Lock()
+
+def get_radeontop_monitor(bus_id):
+    with radeontop_monitors_lock:
+        monitor = radeontop_monitors.get(bus_id)
+        if monitor is None:
+            monitor = radeontop_monitors[bus_id] = RadeontopMonitor(bus_id)
+            monitor.start()
+    return monitor
+
+# Processes whose GPU share is reported as vrchat_gpu (Proton runs VRChat as VRChat.exe)
+VRCHAT_PROCESS_NAMES = ("VRChat.exe", "VRChat")
+
+class DrmFdinfoMonitor:
+    """Compute GPU engine utilisation from the drm-engine-* counters in /proc/*/fdinfo.
+
+    Works for any driver exposing DRM fdinfo (i915, xe, amdgpu, ...) and gives
+    per-process shares. Which fds are DRM clients is cached per PID and only
+    re-resolved every `rescan_every` samples, so steady-state cost is one
+    fdinfo read per DRM client.
+    """
+
+    def __init__(self, min_interval=0.5, rescan_every=10):
+        self.min_interval = min_interval
+        self.rescan_every = rescan_every
+        self.lock = threading.Lock()
+        self.drm_fds = {}  # pid -> list of DRM fds
+        self.names = {}  # pid -> comm
+        self.prev = {}  # (pdev, client id, engine) -> (busy, total or None)
+        self.prev_time = None
+        self.scans = 0
+        self.devices = {}  # bus id -> {"usage": pct, "engines": {name: pct}}
+        self.processes = {}  # pid -> pct of the busiest engine
+        self.last_sample = 0.0
+
+    def resolve_fds(self, pid):
+        """List a process's DRM file descriptors."""
+        fd_dir = os.path.join(PROC_ROOT, pid, "fd")
+        fds = []
+        for fd in os.listdir(fd_dir):
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)).startswith("/dev/dri/"):
+                    fds.append(fd)
+            except OSError:
+                continue
+        return fds
+
+    def read_fdinfo(self, pid, fd):
+        """Parse the drm-* keys of one fdinfo file into a dict."""
+        info = {}
+        with open(os.path.join(PROC_ROOT, pid, "fdinfo", fd), "r") as f:
+            for line in f:
+                if line.startswith("drm-"):
+                    key, _, value = line.partition(":")
+                    info[key] = value.split()[0] if value.split() else ""
+        return info
+
+    def scan(self):
+        """Return {(pdev, client id): (pid, counters)} for every live DRM client."""
+        rescan = self.scans % self.rescan_every == 0
+        self.scans += 1
+        pids = [pid for pid in os.listdir(PROC_ROOT) if pid.isdigit()]
+        live = set(pids)
+        for pid in list(self.drm_fds):
+            if pid not in live:
+                del self.drm_fds[pid]
+                self.names.pop(pid, None)
+        clients = {}
+        for pid in pids:
+            if rescan or pid not in self.drm_fds:
+                try:
+                    self.drm_fds[pid] = self.resolve_fds(pid)
+                except OSError:
+                    self.drm_fds[pid] = []  # exited or not ours to read
+            for fd in self.drm_fds[pid]:
+                try:
+                    info = self.read_fdinfo(pid, fd)
+                except OSError:
+                    continue
+                pdev = info.get("drm-pdev")
+                client = info.get("drm-client-id")
+                if not pdev or not client:
+                    continue
+                # Several fds can share one client (dup/fork); count it once
+                clients.setdefault((normalize_bus_id(pdev), client), (pid, info))
+        return clients
+
+    def sample(self):
+        """Rescan fdinfo and update device and per-process utilisation from the deltas."""
+        with self.lock:
+            now = time.monotonic()
+            clients = self.scan()
+            elapsed_ns = (now - self.prev_time) * 1e9 if self.prev_time else None
+            current = {}
+            devices = {}
+            processes = {}
+            for (bus_id, client), (pid, info) in clients.items():
+                for key, value in info.items():
+                    try:
+                        if key.startswith("drm-engine-") and not key.startswith("drm-engine-capacity-"):
+                            engine, busy, total = key[len("drm-engine-"):], int(value), None
+                        elif key.startswith("drm-cycles-"):
+                            engine = key[len("drm-cycles-"):]
+                            busy = int(value)
+                            total = int(info.get(f"drm-total-cycles-{engine}", 0))
+                        else:
+                            continue
+                        capacity = int(info.get(f"drm-engine-capacity-{engine}", 1) or 1)
+                    except ValueError:
+                        continue
+                    counter = (bus_id, client, engine)
+                    current[counter] = (busy, total)
+                    prev = self.prev.get(counter)
+                    if prev is None or elapsed_ns is None:
+                        continue
+                    if total is not None:
+                        span = total - (prev[1] or 0)
+                    else:
+                        span = elapsed_ns
+                    if span <= 0 or busy < prev[0]:
+                        continue
+                    pct = 100.0 * (busy - prev[0]) / span / capacity
+                    engines = devices.setdefault(bus_id, {})
+                    engines[engine] = engines.get(engine, 0.0) + pct
+                    per_pid = processes.setdefault(pid, {})
+                    per_pid[engine] = per_pid.get(engine, 0.0) + pct
+            self.prev = current
+            self.prev_time = now
+            self.last_sample = now
+            self.devices = {
+                bus_id: {"usage": round(min(max(engines.values()), 100.0), 1),
+                         "engines": {name: round(min(pct, 100.0), 1) for name, pct in engines.items()}}
+                for bus_id, engines in devices.items()
+            }
+            self.processes = {
+                pid: round(min(max(engines.values()), 100.0), 1) for pid, engines in processes.items()
+            }
+
+    def maybe_sample(self):
+        if time.monotonic() - self.last_sample >= self.min_interval:
+            self.sample()
+
+    def usage(self, bus_id):
+        """Return the busiest-engine utilisation of a GPU, or None without fdinfo data."""
+        self.maybe_sample()
+        device = self.devices.get(bus_id)
+        return device["usage"] if device else None
+
+    def process_name(self, pid):
+        name = self.names.get(pid)
+        if name is None:
+            try:
+                with open(os.path.join(PROC_ROOT, pid, "comm"), "r") as f:
+                    name = f.read().strip()
+            except OSError:
+                name = ""
+            self.names[pid] = name
+        return name
+
+    def process_usage(self, names):
+        """Return the summed GPU share of processes with the given names."""
+        self.maybe_sample()
+        return round(sum(
+            pct for pid, pct in self.processes.items() if self.process_name(pid) in names
+        ), 1)
+
+fdinfo_monitor = DrmFdinfoMonitor()
+
+def sample_gpu(gpu, config):
+    """Read usage, temperature and VRAM for one GPU."""
+    sensors = get_sysfs_sampler(gpu).snapshot()
+    entry = {"bus_id": gpu["bus_id"], "type": gpu["type"], "card": gpu["card"]}
+    if gpu["type"] == "nvidia":
+        nvidia = get_nvidia_monitor().get(gpu["bus_id"])
+        if nvidia:
+            # nvidia-smi reports MiB; mirror the sysfs readings nvidia does not expose
+            sensors = sensors._replace(
+                gpu_busy=nvidia.usage,
+                gpu_temp=nvidia.temp,
+                vram_used=nvidia.vram_used / 1024 if nvidia.vram_used is not None else None,
+                vram_total=nvidia.vram_total / 1024 if nvidia.vram_total is not None else None,
+            )
+            entry["power"] = nvidia.power
+            entry["clock"] = nvidia.clock
+    radeontop = radeontop_monitors.get(gpu["bus_id"])
+    sample = radeontop.get() if radeontop else None
+    if sample:
+        if sensors.vram_used is None and sample.vram_mb is not None:
+            sensors = sensors._replace(vram_used=sample.vram_mb / 1024)
+        entry["gtt_used"] = sample.gtt_mb
+        entry["clock"] = sample.sclk_ghz * 1000 if sample.sclk_ghz is not None else None
+    if "gpu_usage" in config.sampled:
+        if gpu["type"] in ("amd", "nvidia") and sensors.gpu_busy is not None:
+            entry["usage"] = sensors.gpu_busy
+        else:
+            entry["usage"] = get_gpu_usage_by_type(gpu)
+    if "gpu_temp" in config.sampled:
+        entry["temp"] = sensors.gpu_temp or 0.0
+        if config.temp_unit == "F":
+            entry["temp"] = entry["temp"] * 9/5 + 32
+    if "vram_usage" in config.sampled:
+        entry["vram_used"] = round(sensors.vram_used or 0.0, 1)
+        entry["vram_total"] = round(sensors.vram_total or 0.0, 1)
+    return entry
+
+def summarize_gpus(entries, primary, config):
+    """Reduce per-GPU entries to the gpu_* stats shown in the chatbox."""
+    if not entries:
+        return {}
+    if config.gpu_display == "aggregate" and len(entries) > 1:
+        summary = {}
+        if "gpu_usage" in config.sampled:
+            summary["gpu_usage"] = round(sum(e["usage"] for e in entries) / len(entries), 1)
+        if "gpu_temp" in config.sampled:
+            summary["gpu_temp"] = max(e["temp"] for e in entries)
+        if "vram_usage" in config.sampled:
+            summary["vram_used"] = round(sum(e["vram_used"] for e in entries), 1)
+            summary["vram_total"] = round(sum(e["vram_total"] for e in entries), 1)
+        return summary
+    if config.gpu_display == "busiest" and "gpu_usage" in config.sampled:
+        chosen = max(entries, key=lambda e: e["usage"])
+    else:
+        primary_bus = primary["bus_id"] if primary else None
+        chosen = next((e for e in entries if e["bus_id"] == primary_bus), entries[0])
+    summary = {}
+    for key, name in (("usage", "gpu_usage"), ("temp", "gpu_temp"),
+                      ("vram_used", "vram_used"), ("vram_total", "vram_total"),
+                      ("power", "gpu_power"), ("clock", "gpu_clock")):
+        if key in chosen:
+            summary[name] = chosen[key]
+    return summary
+
+def get_gpu_stats(gpus, primary, config):
+    """Sample every (selected) GPU in one pass and summarize them per config."""
+    if not config.sampled & {"gpu_usage", "gpu_temp", "vram_usage", "vrchat_gpu"} or not gpus:
+        return {}
+    sampled = [gpu for gpu in gpus if gpu["bus_id"] in config.gpu_selected] or list(gpus)
+    if config.gpu_display == "primary" and primary and primary not in sampled:
+        sampled.append(primary)  # summarize_gpus shows it even when it is not selected
+    entries = [sample_gpu(gpu, config) for gpu in sampled]
+    stats = summarize_gpus(entries, primary, config)
+    stats["gpus"] = entries
+    if "vrchat_gpu" in config.sampled:
+        try:
+            stats["vrchat_gpu"] = fdinfo_monitor.process_usage(VRCHAT_PROCESS_NAMES)
+        except OSError as e:
+            log.debug("fdinfo error: %s", e)
+    return stats
+
+def get_sensor_stats(config):
+    """Get CPU temperature and RAM stats based on config."""
+    stats = {}
+    if "cpu_temp" in config.sampled:
+        stats["cpu_temp"] = get_sysfs_sampler(None).snapshot().cpu_temp or 0.0
+        if config.temp_unit == "F":
+            stats["cpu_temp"] = stats["cpu_temp"] * 9/5 + 32
+    if "ram_usage" in config.sampled:
+        mem = psutil.virtual_memory()
+        stats["ram_used"] = round(mem.used / 1024**3, 1)
+        stats["ram_total"] = round(mem.total / 1024**3, 1)
+    return stats
+
+def get_system_stats(gpus, primary, config):
+    """Get system stats based on config."""
+    stats = get_cpu_stats(config)
+    stats.update(get_gpu_stats(gpus, primary, config))
+    stats.update(get_sensor_stats(config))
+    return stats
+
+def get_gpu_usage_by_type(gpu):
+    """Get usage for a specific GPU."""
+    gpu_type = gpu["type"]
+    bus_id = gpu["bus_id"]
+    card = gpu.get("card")
+
+    if gpu_type == "amd":
+        if card:
+            sampler = get_sysfs_sampler(gpu)
+            if sampler.has("gpu_busy"):
+                usage = sampler.read("gpu_busy")
+                if usage is not None:
+                    usage = float(usage)
+                    log.debug("AMD GPU usage (sysfs, %s, bus %s): %s%%", card, bus_id, usage)
+                    return usage
+            else:
+                log.debug("sysfs error for %s (bus %s): gpu_busy_percent unavailable", card, bus_id)
+
+        usage = fdinfo_monitor.usage(bus_id)
+        if usage is not None:
+            log.debug("AMD GPU usage (fdinfo, bus %s): %s%%", bus_id, usage)
+            return usage
+
+        sample = get_radeontop_monitor(bus_id).get()
+        if sample and sample.usage is not None:
+            log.debug("AMD GPU usage (radeontop, bus %s): %s%%", bus_id, sample.usage)
+            return sample.usage
+        log.debug("No AMD GPU usage data from radeontop")
+
+    elif gpu_type == "nvidia":
+        sample = get_nvidia_monitor().get(bus_id)
+        if sample and sample.usage is not None:
+            log.debug("NVIDIA GPU usage (nvidia-smi, bus %s): %s%%", bus_id, sample.usage)
+            return sample.usage
+        log.debug("No NVIDIA GPU usage data for bus %s", bus_id)
+    elif gpu_type == "intel":
+        usage = fdinfo_monitor.usage(bus_id)
+        if usage is not None:
+            log.debug("Intel GPU usage (fdinfo, bus %s): %s%%", bus_id, usage)
+            return usage
+        log.debug("No Intel GPU usage data for bus %s", bus_id)
+    return 0.0
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+MPRIS_PLAYER = "org.mpris.MediaPlayer2.Player"
+
+MusicState = namedtuple("MusicState", ["status", "title", "artist", "position", "length"])
+
+def format_duration(seconds):
+    """Format seconds like playerctl's duration() helper (M:SS or H:MM:SS)."""
+    seconds = int(max(seconds, 0))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+class MusicProvider:
+    """Track MPRIS players from one long-lived subscription and extrapolate the position.
+
+    Uses D-Bus signals (PropertiesChanged/Seeked/NameOwnerChanged) through jeepney
+    when it is available, otherwise a single `playerctl --follow` stream.
+    """
+
+    FOLLOW_FORMAT = "{{status}}\t{{title}}\t{{artist}}\t{{position}}\t{{mpris:length}}"
+
+    def __init__(self, bus_address="SESSION", playerctl="playerctl"):
+        self.bus_address = bus_address
+        self.playerctl = playerctl
+        self.lock = threading.Lock()
+        self.players = {}  # bus name -> dict of cached player state
+        self.backend = None
+        self.running = False
+        self.thread = None
+        self.process = None
+        self.ready = threading.Event()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def run(self):
+        try:
+            self.run_dbus()
+            return
+        except ImportError:
+            log.warning("jeepney not installed; using playerctl --follow for music")
+        except Exception as e:
+            log.warning(f"MPRIS D-Bus error: {e}. Falling back to playerctl --follow")
+        self.run_playerctl()
+
+    # -- state --------------------------------------------------------------
+
+    def update_player(self, name, **changes):
+        with self.lock:
+            player = self.players.setdefault(name, {
+                "status": "Stopped", "title": "", "artist": "", "length": 0.0,
+                "position": 0.0, "stamp": time.monotonic(), "rate": 1.0,
+            })
+            if "position" in changes:
+                changes["stamp"] = time.monotonic()
+            elif "status" in changes and changes["status"] != player["status"]:
+                # Freeze the extrapolated position at the moment playback changes
+                player["position"] = self.extrapolate(player)
+                player["stamp"] = time.monotonic()
+            player.update(changes)
+
+    def remove_player(self, name):
+        with self.lock:
+            self.players.pop(name, None)
+
+    @staticmethod
+    def extrapolate(player):
+        position = player["position"]
+        if player["status"] == "Playing":
+            position += (time.monotonic() - player["stamp"]) * player["rate"]
+        if player["length"] > 0:
+            position = min(position, player["length"])
+        return position
+
+    def snapshot(self):
+        """Return the MusicState of the most relevant player (playing ones first)."""
+        with self.lock:
+            if not self.players:
+                return None
+            player = next(
+                (p for p in self.players.values() if p["status"] == "Playing"),
+                next(iter(self.players.values())),
+            )
+            return MusicState(
+                status=player["status"],
+                title=player["title"],
+                artist=player["artist"],
+                position=self.extrapolate(player),
+                length=player["length"],
+            )
+
+    # -- D-Bus backend ------------------------------------------------------
+
+    def run_dbus(self):
+        from jeepney import DBusAddress, DBusErrorResponse, HeaderFields, MatchRule, Properties, message_bus
+        from jeepney.io.blocking import open_dbus_connection
+        from jeepney.wrappers import unwrap_msg
+
+        conn = open_dbus_connection(bus=self.bus_address)
+        self.backend = "dbus"
+        owners = {}  # unique name -> well-known name
+
+        def call(msg):
+            """Send a method call and return the reply body; raises DBusErrorResponse on an error reply."""
+            return unwrap_msg(conn.send_and_get_reply(msg))
+
+        def load(name):
+            props = Properties(DBusAddress(MPRIS_PATH, bus_name=name, interface=MPRIS_PLAYER))
+            try:
+                owner = call(message_bus.GetNameOwner(name))[0]
+                properties = call(props.get_all())[0]
+            except DBusErrorResponse as e:
+                # Gone already, or not really a player; don't create an empty entry for it
+                log.debug("MPRIS: skipping %s: %s", name, e)
+                return
+            owners[owner] = name
+            self.apply_properties(name, properties)
+
+        rules = [
+            MatchRule(type="signal", interface="org.freedesktop.DBus.Properties",
+                      member="PropertiesChanged", path=MPRIS_PATH),
+            MatchRule(type="signal", interface=MPRIS_PLAYER, member="Seeked", path=MPRIS_PATH),
+            MatchRule(type="signal", sender="org.freedesktop.DBus",
+                      interface="org.freedesktop.DBus", member="NameOwnerChanged"),
+        ]
+        rules[2].add_arg_condition(0, MPRIS_PREFIX.rstrip("."), "namespace")
+        for rule in rules:
+            call(message_bus.AddMatch(rule))
+
+        with conn.filter(MatchRule(type="signal"), bufsize=256) as signals:
+            for name in call(message_bus.ListNames())[0]:
+                if name.startswith(MPRIS_PREFIX):
+                    load(name)
+            log.info(f"MPRIS: watching {len(self.players)} player(s) over D-Bus")
+            self.ready.set()
+            while self.running:
+                try:
+                    msg = conn.recv_until_filtered(signals, timeout=1.0)
+                except TimeoutError:
+                    continue
+                member = msg.header.fields.get(HeaderFields.member)
+                sender = msg.header.fields.get(HeaderFields.sender)
+                if member == "NameOwnerChanged":
+                    name, _old, new = msg.body
+                    if not name.startswith(MPRIS_PREFIX):
+                        continue
+                    if new:
+                        load(name)
+                    else:
+                        self.remove_player(name)
+                        owners = {k: v for k, v in owners.items() if v != name}
+                    continue
+                name = owners.get(sender)
+                if name is None:
+                    continue
+                if member == "Seeked":
+                    self.update_player(name, position=msg.body[0] / 1e6)
+                elif member == "PropertiesChanged" and msg.body[0] == MPRIS_PLAYER:
+                    changed = msg.body[1]
+                    self.apply_properties(name, changed)
+                    if "PlaybackStatus" in changed and "Position" not in changed:
+                        props = Properties(DBusAddress(MPRIS_PATH, bus_name=name, interface=MPRIS_PLAYER))
+                        try:
+                            position = call(props.get("Position"))[0][1]
+                        except DBusErrorResponse as e:
+                            log.debug("MPRIS: no position from %s: %s", name, e)
+                        else:
+                            self.update_player(name, position=position / 1e6)
+        conn.close()
+
+    def apply_properties(self, name, props):
+        """Apply an a{sv} dict of MPRIS player properties to the cache."""
+        changes = {}
+        if "PlaybackStatus" in props:
+            changes["status"] = props["PlaybackStatus"][1]
+        if "Rate" in props:
+            changes["rate"] = float(props["Rate"][1])
+        if "Position" in props:
+            changes["position"] = props["Position"][1] / 1e6
+        if "Metadata" in props:
+            metadata = {key: value for key, (_sig, value) in props["Metadata"][1].items()}
+            artist = metadata.get("xesam:artist", "")
+            if isinstance(artist, list):
+                artist = ", ".join(artist)
+            changes["title"] = metadata.get("xesam:title", "")
+            changes["artist"] = artist
+            changes["length"] = metadata.get("mpris:length", 0) / 1e6
+        self.update_player(name, **changes)
+
+    # -- playerctl fallback -------------------------------------------------
+
+    def run_playerctl(self):
+        self.backend = "playerctl"
+        backoff = 1.0
+        while self.running:
+            try:
+                self.process = subprocess.Popen(
+                    [self.playerctl, "--follow", "metadata", "--format", self.FOLLOW_FORMAT],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    bufsize=1,
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                log.warning(f"Music detection error: {e}")
+                self.ready.set()
+                return
+            for line in self.process.stdout:
+                backoff = 1.0
+                self.parse_follow_line(line)
+                self.ready.set()
+            self.process.wait()
+            self.remove_player("playerctl")
+            if self.running:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def parse_follow_line(self, line):
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) != 5 or not fields[0]:
+            self.remove_player("playerctl")
+            return
+        status, title, artist, position, length = fields
+        try:
+            position = int(position) / 1e6 if position else 0.0
+            length = int(length) / 1e6 if length else 0.0
+        except ValueError:
+            position, length = 0.0, 0.0
+        self.update_player("playerctl", status=status, title=title, artist=artist,
+                           position=position, length=length)
+
+# Started on first use so the subscription is only made when music is enabled
+music_provider = None
+
+def get_music_provider():
+    global music_provider
+    if music_provider is None:
+        music_provider = MusicProvider()
+        music_provider.start()
+    return music_provider
+
+def get_music_info(config):
+    """Get music info from the cached MPRIS state."""
+    if not config.music_enable:
+        return ""
+    state = get_music_provider().snapshot()
+    if state is None or state.status != "Playing":
+        log.debug("Player status: %s", state.status if state else "No player")
+        return "⏸️"
+    music = f"{state.title} - {state.artist}"
+    if music == " - ":
+        log.debug("Empty or invalid metadata")
+        return "⏸️"
+    log.debug("Music detected: %s", music)
+    prefix = ""
+    if config.music_prefix == "emoji":
+        prefix = "🎶 "
+    elif config.music_prefix == "text":
+        prefix = "Listening to: "
+    output = f"{prefix}{music}"
+    if config.music_progress and state.length > 0:
+        output += f" {format_duration(state.position)}/{format_duration(state.length)}"
+    return output
+
+def get_current_time(config):
+    """Get current time based on config."""
+    if not config.time_enable:
+        return ""
+    try:
+        tz = tzlocal.get_localzone()
+        fmt = "%H:%M" if config.time_24hour else "%I:%M %p"
+        time_str = datetime.now(tz).strftime(fmt)
+        if config.time_timezone:
+            import time as time_mod
+            tz_name = time_mod.tzname[0]  # e.g., PDT
+            time_str += f" {tz_name}"
+        if config.time_prefix:
+            return f"My time: {time_str}"
+        log.debug("Time config: 24hour=%s, timezone=%s, prefix=%s", config.time_24hour, config.time_timezone, config.time_prefix)
+        return time_str
+    except Exception as e:
+        log.warning(f"Time error: {e}")
+        return ""
+
+# Default refresh interval and timeout (seconds) for each provider
+PROVIDER_INTERVALS = {
+    "cpu": (1.0, 1.0),
+    "gpu": (1.0, 2.0),
+    "sensors": (2.0, 2.0),
+    "music": (1.0, 2.0),
+    "time": (1.0, 1.0),
+    "chat": (0.25, 1.0),
+}
+
+# Fastest a stats provider runs when it feeds avatar parameters
+MIN_PROVIDER_INTERVAL = 0.1
+
+def provider_interval(name, config):
+    """Return a provider's interval: its default, or the avatar rate while it feeds a mapped parameter."""
+    interval = PROVIDER_INTERVALS[name][0]
+    if name in config.avatar_providers:
+        interval = min(interval, max(1.0 / config.avatar_rate, MIN_PROVIDER_INTERVAL))
+    return interval
+
+class LatestValues:
+    """Thread-safe table holding the newest value each provider has published."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # name -> [value, monotonic stamp, max age, error, default]
+
+    def register(self, name, default, max_age):
+        with self.lock:
+            self.entries[name] = [default, None, max_age, None, default]
+
+    def publish(self, name, value):
+        with self.lock:
+            entry = self.entries[name]
+            entry[0] = value
+            entry[1] = time.monotonic()
+            entry[3] = None
+
+    def fail(self, name, error, expire=False):
+        """Record a provider error; with expire, also stop serving its last value."""
+        with self.lock:
+            entry = self.entries[name]
+            entry[3] = error
+            if expire:
+                entry[1] = None
+
+    def ages(self):
+        """Return seconds since each provider last published (None if it never has)."""
+        now = time.monotonic()
+        with self.lock:
+            return {
+                name: now - entry[1] if entry[1] is not None else None
+                for name, entry in self.entries.items()
+            }
+
+    def get(self, name):
+        """Return the latest value, or the registered default if the provider has gone stale."""
+        with self.lock:
+            value, stamp, max_age, _error, default = self.entries[name]
+            if stamp is None or time.monotonic() - stamp > max_age:
+                return default
+            return value
+
+class ProviderWorker:
+    """Long-lived daemon thread that runs a provider's calls one at a time, on request.
+
+    Daemon, so a hung call never blocks exit; retire() lets the thread end
+    once its current call (if any) returns.
+    """
+
+    def __init__(self, func, name):
+        self.func = func
+        self.request = threading.Event()
+        self.done = threading.Event()
+        self.value = self.error = None
+        self.retired = False
+        threading.Thread(target=self.run, name=name, daemon=True).start()
+
+    def call(self):
+        """Start one call; done is set when it has a value or an error."""
+        self.done.clear()
+        self.value = self.error = None
+        self.request.set()
+
+    def retire(self):
+        self.retired = True
+        self.request.set()
+
+    def run(self):
+        while True:
+            self.request.wait()
+            self.request.clear()
+            if self.retired:
+                return
+            try:
+                self.value = self.func()
+            except Exception as e:
+                self.error = e
+            self.done.set()
+
+class ProviderScheduler:
+    """Run each provider on its own thread and interval, publishing into a LatestValues table.
+
+    Calls run on one long-lived ProviderWorker per provider and are
+    abandoned once they take longer than the provider's timeout: the
+    timeout is counted and the field reads back as its default until a
+    call completes again. A hung worker is replaced by a fresh one, but
+    only while no earlier abandoned worker is still stuck, so at most two
+    threads per provider are ever tied up.
+    An interval may be a callable, re-read before every wait, as long as it
+    never returns more than the provider's default interval.
+    """
+
+    def __init__(self, table=None):
+        self.table = table or LatestValues()
+        self.providers = []
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def add(self, name, func, interval=None, timeout=None, default=None):
+        default_interval, default_timeout = PROVIDER_INTERVALS.get(name, (1.0, 1.0))
+        interval = interval if interval is not None else default_interval
+        timeout = timeout if timeout is not None else default_timeout
+        max_interval = default_interval if callable(interval) else interval
+        self.table.register(name, default, max_interval + timeout)
+        self.providers.append((name, func, interval, timeout))
+
+    def start(self):
+        for name, func, interval, timeout in self.providers:
+            thread = threading.Thread(
+                target=self.run_provider, args=(name, func, interval, timeout),
+                name=f"provider-{name}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_provider(self, name, func, interval, timeout):
+        stage = f"provider.{name}"
+        worker = ProviderWorker(func, f"provider-{name}-worker")
+        abandoned = None
+        pending = False
+        next_run = time.monotonic()
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            if not pending:
+                worker.call()
+                pending = True
+            if not worker.done.wait(timeout):
+                hot_path_metrics.observe(stage, time.perf_counter() - start, timeout=True)
+                log.debug("Provider %s timed out after %.1fs", name, timeout)
+                self.table.fail(name, TimeoutError(f"no result within {timeout}s"), expire=True)
+                if abandoned is None or abandoned.done.is_set():
+                    # Leave the hung call to finish on its own; its thread exits afterwards
+                    worker.retire()
+                    abandoned = worker
+                    worker = ProviderWorker(func, f"provider-{name}-worker")
+                    pending = False
+            elif worker.error is not None:
+                hot_path_metrics.observe(stage, time.perf_counter() - start, error=True)
+                log.warning(f"Provider {name} error: {worker.error}")
+                self.table.fail(name, worker.error)
+                pending = False
+            else:
+                hot_path_metrics.observe(stage, time.perf_counter() - start)
+                self.table.publish(name, worker.value)
+                pending = False
+            next_run += interval() if callable(interval) else interval
+            now = time.monotonic()
+            if next_run < now:
+                next_run = now
+            self.stop_event.wait(next_run - now)
+        worker.retire()
+
+# numpy is optional; resolved on first use (False when unavailable)
+numpy_module = None
+
+def get_numpy():
+    global numpy_module
+    if numpy_module is None:
+        try:
+            numpy_module = importlib.import_module("numpy")
+        except ImportError:
+            numpy_module = False
+    return numpy_module
+
+class MetricRing:
+    """Fixed-size ring buffer of (timestamp, value) pairs backed by array('d')."""
+
+    __slots__ = ("capacity", "values", "stamps", "head", "count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.values = array("d", bytes(8 * capacity))
+        self.stamps = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, value, stamp):
+        self.values[self.head] = value
+        self.stamps[self.head] = stamp
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, seconds, now=None):
+        """Return the values recorded in the last `seconds`, oldest first."""
+        now = time.monotonic() if now is None else now
+        cutoff = now - seconds
+        start = (self.head - self.count) % self.capacity
+        np = get_numpy()
+        if np:
+            values = np.frombuffer(self.values, dtype=np.float64)
+            stamps = np.frombuffer(self.stamps, dtype=np.float64)
+            order = (np.arange(self.count) + start) % self.capacity
+            return values[order][stamps[order] >= cutoff]
+        indices = [(start + i) % self.capacity for i in range(self.count)]
+        return [self.values[i] for i in indices if self.stamps[i] >= cutoff]
+
+    def aggregate(self, seconds, now=None):
+        """Return min/avg/max/p95 over a window, or None if it is empty."""
+        values = self.window(seconds, now)
+        if len(values) == 0:
+            return None
+        np = get_numpy()
+        if np:
+            return {
+                "min": float(values.min()),
+                "avg": float(values.mean()),
+                "max": float(values.max()),
+                "p95": float(np.percentile(values, 95)),
+            }
+        ordered = sorted(values)
+        return {
+            "min": ordered[0],
+            "avg": sum(ordered) / len(ordered),
+            "max": ordered[-1],
+            "p95": ordered[max(math.ceil(0.95 * len(ordered)) - 1, 0)],
+        }
+
+class MetricsHistory:
+    """Keep a MetricRing per numeric stat so windowed aggregates can be shown."""
+
+    # Scalar stats worth keeping history for
+    METRICS = (
+        "cpu_usage", "cpu_max_core", "cpu_temp", "gpu_usage", "gpu_temp",
+        "ram_used", "vram_used", "vrchat_gpu", "gpu_power", "gpu_clock",
+    )
+    SPARK = "▁▂▃▄▅▆▇█"
+
+    def __init__(self, capacity=3600):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.rings = {}
+
+    def record(self, stats, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for name in self.METRICS:
+                value = stats.get(name)
+                if value is None:
+                    continue
+                ring = self.rings.get(name)
+                if ring is None:
+                    ring = self.rings[name] = MetricRing(self.capacity)
+                ring.append(float(value), now)
+
+    def aggregate(self, name, seconds, now=None):
+        with self.lock:
+            ring = self.rings.get(name)
+            return ring.aggregate(seconds, now) if ring else None
+
+    def sparkline(self, name, seconds, width=24, scale=100.0):
+        """Render a window of a percentage metric as a block-character sparkline."""
+        with self.lock:
+            ring = self.rings.get(name)
+            values = list(ring.window(seconds)) if ring else []
+        if not values:
+            return ""
+        step = max(len(values) / width, 1.0)
+        buckets = []
+        position = 0.0
+        while int(position) < len(values):
+            chunk = values[int(position):max(int(position + step), int(position) + 1)]
+            buckets.append(sum(chunk) / len(chunk))
+            position += step
+        top = len(self.SPARK) - 1
+        return "".join(self.SPARK[min(max(int(v / scale * top + 0.5), 0), top)] for v in buckets)
+
+def format_window(seconds):
+    """Format a window length compactly: 30s, 1m, 1h."""
+    seconds = int(seconds)
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+def register_providers(scheduler, get_config, get_gpus, get_chat):
+    """Add the standard stats/time/music/chat providers to a scheduler.
+
+    get_gpus returns (all GPUs, primary GPU).
+    """
+    def interval(name):
+        return lambda: provider_interval(name, get_config())
+
+    scheduler.add("cpu", lambda: get_cpu_stats(get_config()), interval("cpu"), default={})
+    scheduler.add("gpu", lambda: get_gpu_stats(*get_gpus(), get_config()), interval("gpu"), default={})
+    scheduler.add("sensors", lambda: get_sensor_stats(get_config()), interval("sensors"), default={})
+    scheduler.add("music", lambda: get_music_info(get_config()), default="")
+    scheduler.add("time", lambda: get_current_time(get_config()), default="")
+    scheduler.add("chat", get_chat, default="")
+
+def collect_tick(values, config, recent_chat="", history=None, avatar=None):
+    """Gather build_message inputs from the latest provider values.
+
+    recent_chat is a sent message still inside its chat timeout; live chat
+    input takes precedence over it. With a history, the stats are recorded
+    and *_avg fields over the configured window are added. With an avatar
+    parameter cache, its avatar_* values are added for templates.
+    """
+    stats = {}
+    if config.system_enable:
+        for name in ("cpu", "gpu", "sensors"):
+            stats.update(values.get(name))
+        if history is not None:
+            history.record(stats)
+            for name in ("cpu_usage", "gpu_usage"):
+                window = history.aggregate(name, config.average_window)
+                if window:
+                    stats[f"{name}_avg"] = window["avg"]
+    if avatar is not None:
+        stats.update(avatar.template_values())
+    chat_text = values.get("chat") or recent_chat
+    return stats, values.get("time"), values.get("music"), chat_text
+
+class TokenBucket:
+    """Token bucket rate limiter on the monotonic clock."""
+
+    def __init__(self, interval, burst):
+        self.configure(interval, burst)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+
+    def configure(self, interval, burst):
+        self.interval = max(float(interval), 0.0)
+        self.burst = max(int(burst), 1)
+
+    def refill(self):
+        now = time.monotonic()
+        if self.interval > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) / self.interval)
+        else:
+            self.tokens = float(self.burst)
+        self.stamp = now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        self.refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * self.interval
+
+    def take(self):
+        self.refill()
+        self.tokens -= 1
+
+@lru_cache(maxsize=16)
+def parse_destinations(text):
+    """Parse "host:port[=filter|filter...], ..." into (host, port, filters) tuples.
+
+    IPv6 hosts may be written in brackets ("[::1]:9000"). Filters are glob
+    patterns on the OSC address (default "*"). Malformed entries are skipped
+    with a warning.
+    """
+    destinations = []
+    for entry in text.split(","):
+        if not entry.strip():
+            continue
+        target, _, filters = entry.strip().partition("=")
+        host, _, port = target.strip().rpartition(":")
+        try:
+            port = int(port)
+            if not 0 < port < 65536:
+                raise ValueError
+        except ValueError:
+            log.warning(f"Ignoring OSC destination {entry.strip()!r}")
+            continue
+        patterns = tuple(p.strip() for p in filters.split("|") if p.strip()) or ("*",)
+        host = host.strip().strip("[]")
+        destinations.append((host or "127.0.0.1", port, patterns))
+    return tuple(destinations)
+
+class OscDestination:
+    """One fan-out target with its own address filter, error count and backoff.
+
+    The address stays unresolved (and the destination is skipped) until
+    resolve() succeeds.
+    """
+
+    __slots__ = ("name", "host", "port", "family", "sockaddr", "pattern", "errors", "retry_at")
+
+    def __init__(self, host, port, filters):
+        self.name = f"{host}:{port}"
+        self.host = host
+        self.port = port
+        self.family = self.sockaddr = None
+        self.pattern = re.compile("|".join(fnmatch.translate(f) for f in filters))
+        self.errors = 0
+        self.retry_at = 0.0
+
+    def resolve(self, numeric_only=False):
+        """Look up the IPv4 or IPv6 address; numeric_only never touches DNS."""
+        flags = socket.AI_NUMERICHOST if numeric_only else 0
+        info = socket.getaddrinfo(self.host, self.port, socket.AF_UNSPEC, socket.SOCK_DGRAM, 0, flags)
+        self.family, _type, _proto, _name, self.sockaddr = info[0]
+
+    def wants(self, addresses):
+        return any(self.pattern.match(address) for address in addresses)
+
+class OscFanout:
+    """Encode each OSC message or bundle once and write it to every matching destination.
+
+    Stands in for SimpleUDPClient (send_message/send). Destinations share one
+    non-blocking UDP socket per address family, so a slow or unreachable host
+    never blocks the sender; a destination that errors is skipped with
+    exponential backoff. A full send buffer only drops that datagram.
+    """
+
+    def __init__(self):
+        self.sockets = {}  # address family -> socket
+        self.destinations = ()
+
+    def configure(self, destinations):
+        """Replace the destinations with (host, port, filters) tuples.
+
+        IP literals are usable at once; host names are looked up on a
+        background thread, so DNS never blocks the caller.
+        """
+        configured, lookups = [], []
+        for host, port, filters in destinations:
+            destination = OscDestination(host, port, filters)
+            try:
+                destination.resolve(numeric_only=True)
+            except (OSError, UnicodeError):
+                lookups.append(destination)
+            configured.append(destination)
+        self.destinations = tuple(configured)
+        log.info(f"OSC destinations: {', '.join(d.name for d in configured) or 'none'}")
+        if lookups:
+            threading.Thread(target=self.resolve, args=(lookups,), name="osc-resolve", daemon=True).start()
+
+    @staticmethod
+    def resolve(destinations):
+        for destination in destinations:
+            try:
+                destination.resolve()
+            except (OSError, UnicodeError) as e:
+                log.warning(f"OSC destination {destination.name} error: {e}")
+
+    def resolve_pending(self):
+        """Look up every destination that is still unresolved, on the caller's thread."""
+        self.resolve([destination for destination in self.destinations if destination.sockaddr is None])
+
+    def socket_for(self, family):
+        sock = self.sockets.get(family)
+        if sock is None:
+            sock = self.sockets[family] = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+        return sock
+
+    def send_message(self, address, value):
+        message = osc_message_builder.OscMessageBuilder(address=address)
+        for arg in value if isinstance(value, (list, tuple)) else [value]:
+            message.add_arg(arg)
+        self.send(message.build())
+
+    def send(self, content):
+        """Send a built OscMessage or OscBundle."""
+        self.send_dgram(content.dgram, self.addresses(content))
+
+    @classmethod
+    def addresses(cls, content):
+        if hasattr(content, "address"):
+            return [content.address]
+        return [address for item in content for address in cls.addresses(item)]
+
+    def send_dgram(self, dgram, addresses):
+        now = time.monotonic()
+        for destination in self.destinations:
+            if destination.retry_at > now or not destination.wants(addresses):
+                continue
+            if destination.sockaddr is None:
+                log.debug("OSC destination %s: not resolved yet, skipped a datagram", destination.name)
+                continue
+            start = time.perf_counter()
+            try:
+                self.socket_for(destination.family).sendto(dgram, destination.sockaddr)
+            except BlockingIOError:
+                # Our own send buffer is full; the host is fine, so drop this datagram only
+                hot_path_metrics.observe(f"dest {destination.name}", time.perf_counter() - start, error=True)
+                log.debug("OSC destination %s: send buffer full, dropped a datagram", destination.name)
+                continue
+            except OSError as e:
+                destination.errors += 1
+                destination.retry_at = now + min(0.5 * 2 ** (destination.errors - 1), 30.0)
+                hot_path_metrics.observe(f"dest {destination.name}", time.perf_counter() - start, error=True)
+                if destination.errors == 1:
+                    log.warning(f"OSC destination {destination.name} error: {e}; backing off")
+                continue
+            destination.errors = 0
+            hot_path_metrics.observe(f"dest {destination.name}", time.perf_counter() - start)
+
+def osc_destinations(config):
+    """The VRChat destination from ip/port plus any extra destinations."""
+    return ((config.ip, config.port, ("*",)),) + parse_destinations(config.destinations)
+
+class ChatboxSender:
+    """Single outbound queue in front of the OSC client for /chatbox/input.
+
+    Each priority keeps only its newest pending message, unchanged payloads
+    are dropped (but re-sent every `keepalive` seconds so the chatbox does
+    not expire), and sends are paced by a token bucket. User chat always
+    goes ahead of stats.
+    """
+
+    PRIORITY_CHAT = 0
+    PRIORITY_STATS = 1
+
+    def __init__(self, interval=1.5, burst=3, keepalive=20.0):
+        self.client = None
+        self.bucket = TokenBucket(interval, burst)
+        self.keepalive = keepalive
+        self.cond = threading.Condition()
+        self.pending = {}  # priority -> (message, force)
+        self.last_sent = None
+        self.last_sent_time = 0.0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="chatbox-sender", daemon=True)
+        self.thread.start()
+
+    def configure(self, interval, burst):
+        with self.cond:
+            self.bucket.configure(interval, burst)
+            self.cond.notify()
+
+    def submit(self, message, priority=PRIORITY_STATS, force=False):
+        """Queue a message, replacing any older message of the same priority."""
+        with self.cond:
+            self.pending[priority] = (message, force)
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                priority = min(self.pending)
+                message, force = self.pending[priority]
+                if (not force and message == self.last_sent
+                        and time.monotonic() - self.last_sent_time < self.keepalive):
+                    del self.pending[priority]
+                    continue
+                delay = self.bucket.delay()
+                if delay > 0 or self.client is None:
+                    # Re-check after waiting: a newer or higher-priority message may arrive
+                    self.cond.wait(delay if delay > 0 else 0.5)
+                    continue
+                del self.pending[priority]
+                self.bucket.take()
+                client = self.client
+            try:
+                with hot_path_metrics.stage("osc_send"):
+                    client.send_message("/chatbox/input", [message, True, False])
+                self.last_sent = message
+                self.last_sent_time = time.monotonic()
+                log.debug("Sent: %s", message)
+                startup_profiler.first_message()
+            except OSError as e:
+                log.warning(f"OSC send error: {e}")
+
+AVATAR_PARAMETER_PREFIX = "/avatar/parameters/"
+
+class AvatarParameterCache:
+    """Latest value per OSC address received from VRChat.
+
+    Holds at most max_entries addresses (new addresses past the cap are
+    counted and dropped), so a flood of messages never grows memory. Avatar
+    parameters are exposed to templates as avatar_<Name>.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.values = {}  # address -> latest value
+        self.names = {}  # address -> template name
+        self.received = 0
+        self.dropped = 0
+
+    def update(self, address, value):
+        with self.lock:
+            self.received += 1
+            if address not in self.values:
+                if len(self.values) >= self.max_entries:
+                    self.dropped += 1
+                    return
+                short = address[len(AVATAR_PARAMETER_PREFIX):] if address.startswith(AVATAR_PARAMETER_PREFIX) else address
+                self.names[address] = "avatar_" + re.sub(r"\W", "_", short.strip("/"))
+            self.values[address] = value
+
+    def get(self, name, default=None):
+        """Return an avatar parameter by name (e.g. "AFK") or a full OSC address."""
+        address = name if name.startswith("/") else AVATAR_PARAMETER_PREFIX + name
+        with self.lock:
+            return self.values.get(address, default)
+
+    def any_active(self, names):
+        """True if any of the named parameters is currently truthy."""
+        return any(self.get(name) for name in names)
+
+    def template_values(self):
+        with self.lock:
+            return {self.names[address]: value for address, value in self.values.items()}
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+            self.names.clear()
+
+class OscReceiver:
+    """asyncio OSC server (VRChat's output port, 9001 by default) feeding an AvatarParameterCache."""
+
+    def __init__(self, cache, host="127.0.0.1"):
+        self.cache = cache
+        self.host = host
+        self.port = None
+        self.loop = None
+        self.stopped = None
+        self.thread = None
+
+    def start(self, port):
+        """(Re)bind to the given port; a falsy port stops the receiver.
+
+        Returns at once, so the Tk thread never waits on the bind; bind errors
+        are logged from the receiver thread.
+        """
+        port = optional_port(port)
+        if port == self.port and self.thread and self.thread.is_alive():
+            return
+        previous = self.thread
+        self.stop()
+        if not port:
+            return
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.stopped = self.loop.create_future()
+        self.thread = threading.Thread(
+            target=self.run, args=(port, self.loop, self.stopped, previous), name="osc-receiver", daemon=True
+        )
+        self.thread.start()
+
+    def run(self, port, loop, stopped, previous):
+        if previous:
+            previous.join(2.0)  # let the old socket close before binding, in case the port is the same
+        try:
+            loop.run_until_complete(self.serve(port, stopped))
+        except OSError as e:
+            log.warning(f"OSC receiver error on port {port}: {e}")
+        finally:
+            loop.close()
+
+    async def serve(self, port, stopped):
+        dispatcher = osc_dispatcher.Dispatcher()
+        dispatcher.set_default_handler(self.on_message)
+        server = osc_server.AsyncIOOSCUDPServer((self.host, port), dispatcher, asyncio.get_running_loop())
+        transport, _protocol = await server.create_serve_endpoint()
+        log.info(f"Listening for VRChat OSC on {self.host}:{port}")
+        try:
+            await stopped
+        finally:
+            transport.close()
+
+    def on_message(self, address, *args):
+        self.cache.update(address, args[0] if len(args) == 1 else args)
+
+    def stop(self):
+        """Tell the receiver thread to close its socket; does not wait for it."""
+        if self.loop:
+            try:
+                self.loop.call_soon_threadsafe(self.stopped.set_result, None)
+            except RuntimeError:
+                pass  # loop already closed
+        self.loop = self.stopped = self.thread = None
+        self.port = None
+
+# One metric -> avatar parameter mapping; the value is scaled from [low, high] to [0, 1]
+AvatarMapping = namedtuple("AvatarMapping", ["metric", "address", "low", "high", "deadband"])
+
+# Provider and stats flag that produce each metric an avatar parameter can be mapped to
+METRIC_SOURCES = {
+    "cpu_usage": ("cpu", "cpu_usage"),
+    "cpu_max_core": ("cpu", "cpu_usage"),
+    "cpu_temp": ("sensors", "cpu_temp"),
+    "ram_used": ("sensors", "ram_usage"),
+    "gpu_usage": ("gpu", "gpu_usage"),
+    "gpu_temp": ("gpu", "gpu_temp"),
+    "vram_used": ("gpu", "vram_usage"),
+    "vrchat_gpu": ("gpu", "vrchat_gpu"),
+    "gpu_power": ("gpu", "gpu_usage"),
+    "gpu_clock": ("gpu", "gpu_usage"),
+}
+
+# Default input range of each metric; *_used metrics are divided by their *_total instead
+METRIC_RANGES = {
+    "cpu_usage": (0.0, 100.0),
+    "cpu_max_core": (0.0, 100.0),
+    "gpu_usage": (0.0, 100.0),
+    "vrchat_gpu": (0.0, 100.0),
+    "cpu_temp": (0.0, 100.0),
+    "gpu_temp": (0.0, 100.0),
+    "gpu_power": (0.0, 450.0),
+    "gpu_clock": (0.0, 3000.0),
+}
+RATIO_METRICS = {"ram_used": "ram_total", "vram_used": "vram_total"}
+DEFAULT_DEADBAND = 0.01
+
+@lru_cache(maxsize=16)
+def parse_avatar_mapping(text):
+    """Parse "metric=Parameter[:low:high[:deadband]], ..." into AvatarMapping tuples.
+
+    A bare parameter name goes under /avatar/parameters/; a full OSC address
+    is used as is. Malformed entries and unknown metrics are skipped with a
+    warning.
+    """
+    mappings = []
+    for entry in text.split(","):
+        if not entry.strip():
+            continue
+        try:
+            metric, target = (part.strip() for part in entry.split("=", 1))
+            parts = target.split(":")
+            address = parts[0] if parts[0].startswith("/") else AVATAR_PARAMETER_PREFIX + parts[0]
+            low, high = METRIC_RANGES.get(metric, (0.0, 1.0))
+            if len(parts) >= 3:
+                low, high = float(parts[1]), float(parts[2])
+            deadband = float(parts[3]) if len(parts) >= 4 else DEFAULT_DEADBAND
+            if not metric or not parts[0] or high == low:
+                raise ValueError
+        except ValueError:
+            log.warning(f"Ignoring avatar parameter mapping {entry.strip()!r}")
+            continue
+        if metric not in METRIC_SOURCES:
+            log.warning(f"Ignoring avatar parameter mapping {entry.strip()!r}: unknown metric {metric!r}")
+            continue
+        mappings.append(AvatarMapping(metric, address, low, high, deadband))
+    return tuple(mappings)
 
-    primary_gpu = get_primary_gpu_xrandr()
-    if primary_gpu and primary_gpu["card"]:
-        usage = get_gpu_usage_by_type(primary_gpu)
-        if usage > 0:
-            primary_gpu_cache = primary_gpu
-            return primary_gpu
+class AvatarParameterSender:
+    """Drive avatar parameters from the latest stats at a fixed rate.
 
-    rendering_gpu = get_rendering_gpu()
-    if rendering_gpu and rendering_gpu["card"]:
-        usage = get_gpu_usage_by_type(rendering_gpu)
-        if usage > 0:
-            primary_gpu_cache = rendering_gpu
-            return rendering_gpu
+    Every tick, each mapped metric is scaled to a 0..1 float; values that
+    moved by at least their deadband (or all of them every `keepalive`
+    seconds, e.g. after an avatar change) go out as one OSC bundle.
+    """
 
-    for gpu in gpus:
-        if gpu["card"]:
-            usage = get_gpu_usage_by_type(gpu)
-            if usage > 0:
-                primary_gpu_cache = gpu
-                return gpu
+    def __init__(self, table, get_config, get_client, keepalive=10.0):
+        self.table = table
+        self.get_config = get_config
+        self.get_client = get_client
+        self.keepalive = keepalive
+        self.last = {}  # address -> last sent value
+        self.last_full = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="avatar-parameters", daemon=True)
 
-    for gpu in gpus:
-        if gpu["bus_id"] == "28:00.0":
-            print(f"Defaulting to RX 6950 XT: {gpu['type']} at {gpu['bus_id']} ({gpu['card']})")
-            primary_gpu_cache = gpu
-            return gpu
+    def start(self):
+        self.thread.start()
 
-    print(f"Defaulting to first GPU: {gpus[0]['type']} at {gpus[0]['bus_id']} ({gpus[0]['card']})")
-    primary_gpu_cache = gpus[0]
-    return gpus[0]
+    def stop(self):
+        self.stop_event.set()
 
-def get_system_stats(gpu, config):
-    """Get system stats based on config."""
-    stats = {}
-    if config["system_stats"]["cpu_usage"].get():
-        stats["cpu_usage"] = psutil.cpu_percent(interval=0.5)
-    if config["system_stats"]["cpu_temp"].get():
-        try:
-            temps = psutil.sensors_temperatures()
-            cpu_temp = None
-            for key, entries in temps.items():
-                if "coretemp" in key or "k10temp" in key:
-                    for entry in entries:
-                        if "Package" in entry.label or "Tctl" in entry.label:
-                            cpu_temp = entry.current
-                            break
-                    if cpu_temp:
-                        break
-            stats["cpu_temp"] = cpu_temp or 0.0
-            if config["system_stats"]["temp_unit"].get() == "F":
-                stats["cpu_temp"] = stats["cpu_temp"] * 9/5 + 32
-        except Exception as e:
-            print(f"CPU temp error: {e}")
-            stats["cpu_temp"] = 0.0
-
-    if config["system_stats"]["gpu_usage"].get():
-        stats["gpu_usage"] = get_gpu_usage_by_type(gpu)
-    if config["system_stats"]["gpu_temp"].get():
-        try:
-            if gpu["card"]:
-                temp_file = glob.glob(f"/sys/class/drm/{gpu['card']}/device/hwmon/*/temp1_input")
-                if temp_file:
-                    with open(temp_file[0], "r") as f:
-                        temp = float(f.read().strip()) / 1000.0
-                    stats["gpu_temp"] = temp
-                    if config["system_stats"]["temp_unit"].get() == "F":
-                        stats["gpu_temp"] = temp * 9/5 + 32
-                else:
-                    stats["gpu_temp"] = 0.0
+    def run(self):
+        next_run = time.monotonic()
+        while not self.stop_event.is_set():
+            config = self.get_config()
+            if config.avatar_enable and config.avatar_mapping:
+                try:
+                    with hot_path_metrics.stage("avatar_send"):
+                        self.tick(config)
+                except OSError as e:
+                    log.warning(f"Avatar parameter send error: {e}")
             else:
-                stats["gpu_temp"] = 0.0
-        except (IOError, ValueError) as e:
-            print(f"GPU temp error: {e}")
-            stats["gpu_temp"] = 0.0
+                self.last.clear()
+            next_run += 1.0 / config.avatar_rate
+            now = time.monotonic()
+            if next_run < now:
+                next_run = now
+            self.stop_event.wait(next_run - now)
 
-    if config["system_stats"]["ram_usage"].get():
-        mem = psutil.virtual_memory()
-        stats["ram_used"] = round(mem.used / 1024**3, 1)
-        stats["ram_total"] = round(mem.total / 1024**3, 1)
-    if config["system_stats"]["vram_usage"].get():
-        try:
-            if gpu["card"]:
-                with open(f"/sys/class/drm/{gpu['card']}/device/mem_info_vram_used", "r") as f:
-                    used = int(f.read().strip()) / 1024**3
-                with open(f"/sys/class/drm/{gpu['card']}/device/mem_info_vram_total", "r") as f:
-                    total = int(f.read().strip()) / 1024**3
-                stats["vram_used"] = round(used, 1)
-                stats["vram_total"] = round(total, 1)
-            else:
-                stats["vram_used"] = 0.0
-                stats["vram_total"] = 0.0
-        except (IOError, ValueError) as e:
-            print(f"VRAM error: {e}")
-            stats["vram_used"] = 0.0
-            stats["vram_total"] = 0.0
-    return stats
+    @staticmethod
+    def normalize(mapping, stats):
+        value = stats.get(mapping.metric)
+        if value is None:
+            return None
+        total_key = RATIO_METRICS.get(mapping.metric)
+        if total_key and mapping.low == 0.0 and mapping.high == 1.0:
+            total = stats.get(total_key)
+            return min(max(value / total, 0.0), 1.0) if total else None
+        return min(max((value - mapping.low) / (mapping.high - mapping.low), 0.0), 1.0)
 
-def get_gpu_usage_by_type(gpu):
-    """Get usage for a specific GPU."""
-    gpu_type = gpu["type"]
-    bus_id = gpu["bus_id"]
-    card = gpu.get("card")
+    def changes(self, config, stats):
+        """Return the (address, value) pairs due this tick and remember them as sent."""
+        now = time.monotonic()
+        full = now - self.last_full >= self.keepalive
+        if full:
+            self.last_full = now
+        due = []
+        for mapping in config.avatar_mapping:
+            value = self.normalize(mapping, stats)
+            if value is None:
+                continue
+            last = self.last.get(mapping.address)
+            if full or last is None or abs(value - last) >= mapping.deadband:
+                self.last[mapping.address] = value
+                due.append((mapping.address, value))
+        return due
 
-    if gpu_type == "amd":
-        if card:
-            try:
-                with open(f"/sys/class/drm/{card}/device/gpu_busy_percent", "r") as f:
-                    usage = float(f.read().strip())
-                print(f"AMD GPU usage (sysfs, {card}, bus {bus_id}): {usage}%")
-                return usage
-            except (IOError, ValueError, FileNotFoundError) as e:
-                print(f"sysfs error for {card} (bus {bus_id}): {e}")
-
-        try:
-            cmd = ["radeontop", "-d", "-", "-l", "1"]
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = process.communicate(timeout=0.5)
-            print(f"radeontop cmd: {cmd}")
-            print(f"radeontop stdout: {stdout}")
-            if stderr:
-                print(f"radeontop stderr: {stderr}")
-                if "Permission denied" in stderr or "root" in stderr:
-                    print("Permission issue. Run with 'sudo' or add user to 'video' group")
-                    print("E.g., 'sudo usermod -aG video $USER' and log out/in")
-
-            match = re.search(r"gpu\s+(\d+\.\d+)%", stdout)
-            if match:
-                usage = float(match.group(1))
-                print(f"AMD GPU usage (radeontop, bus {bus_id}): {usage}%")
-                return usage
-            print("No AMD GPU usage data from radeontop")
-        except (subprocess.SubprocessError, FileNotFoundError) as e:
-            print(f"radeontop error: {e}")
+    def tick(self, config):
+        client = self.get_client()
+        if client is None:
+            return
+        stats = {}
+        for name in ("cpu", "gpu", "sensors"):
+            stats.update(self.table.get(name))
+        if config.temp_unit == "F":
+            # Ranges are in Celsius whatever the chatbox shows
+            for name in ("cpu_temp", "gpu_temp"):
+                if name in stats:
+                    stats[name] = (stats[name] - 32) * 5 / 9
+        due = self.changes(config, stats)
+        if not due:
+            return
+        bundle = osc_bundle_builder.OscBundleBuilder(osc_bundle_builder.IMMEDIATELY)
+        for address, value in due:
+            message = osc_message_builder.OscMessageBuilder(address=address)
+            message.add_arg(float(value), "f")
+            bundle.add_content(message.build())
+        client.send(bundle.build())
 
-    elif gpu_type == "nvidia":
-        print("NVIDIA not supported in this script")
-    elif gpu_type == "intel":
-        print("Intel GPU usage not implemented")
-    return 0.0
+# VRChat chatbox limits, including the skinny-mode suffix
+CHATBOX_MAX_CHARS = 144
+CHATBOX_MAX_LINES = 9
 
-def get_music_info(config):
-    """Get music info using playerctl."""
-    if not config["music"]["enable"].get():
+# When a message is too long, segments with the highest number are shrunk or dropped first
+FIELD_PRIORITIES = {
+    "cpu_usage": 0,
+    "gpu_usage": 0,
+    "time": 1,
+    "cpu_temp": 2,
+    "gpu_temp": 2,
+    "cpu_max_core": 3,
+    "cpu_usage_avg": 3,
+    "gpu_usage_avg": 3,
+    "vrchat_gpu": 3,
+    "gpu_power": 3,
+    "gpu_clock": 3,
+    "ram_used": 4,
+    "ram_total": 4,
+    "vram_used": 4,
+    "vram_total": 4,
+    "music": 5,
+}
+DEFAULT_FIELD_PRIORITY = 3
+
+# One " | "-separated part of a chatbox line; shrinkable text may be cut at a word boundary
+Segment = namedtuple("Segment", ["text", "priority", "shrinkable"])
+
+def elide(text, width):
+    """Shorten text to at most width characters at a word boundary ("" if no word fits)."""
+    if len(text) <= width:
+        return text
+    cut = text.rfind(" ", 0, width)
+    if cut <= 0:
         return ""
-    try:
-        result = subprocess.run(
-            ["playerctl", "status"],
-            capture_output=True,
-            text=True,
-            timeout=0.5
-        )
-        status = result.stdout.strip()
-        if status != "Playing":
-            print(f"Player status: {status or 'No player'}")
-            return "⏸️"
-
-        result = subprocess.run(
-            ["playerctl", "metadata", "--format", "{{title}} - {{artist}}"],
-            capture_output=True,
-            text=True,
-            timeout=0.5
+    return text[:cut].rstrip(" -|/") + "…"
+
+def fit_layout(lines, limit=CHATBOX_MAX_CHARS, max_lines=CHATBOX_MAX_LINES):
+    """Join segment lines into chatbox text of at most limit characters and max_lines lines.
+
+    The least important segment (highest priority number, the later one on
+    ties) is shrunk if it holds free text, otherwise dropped, until it fits.
+    """
+    lines = [[segment for segment in line if segment.text] for line in lines]
+    lines = [line for line in lines if line]
+    while lines:
+        if len(lines) > max_lines:
+            index = max(range(len(lines)), key=lambda i: (min(s.priority for s in lines[i]), i))
+            del lines[index]
+            continue
+        length = sum(len(" | ".join(s.text for s in line)) for line in lines) + len(lines) - 1
+        excess = length - limit
+        if excess <= 0:
+            break
+        _priority, i, j = max(
+            (segment.priority, i, j) for i, line in enumerate(lines) for j, segment in enumerate(line)
         )
-        music = result.stdout.strip()
-        if music and music != " - ":
-            print(f"Music detected: {music}")
-            prefix = ""
-            if config["music"]["prefix"].get() == "emoji":
-                prefix = "🎶 "
-            elif config["music"]["prefix"].get() == "text":
-                prefix = "Listening to: "
-            output = f"{prefix}{music}"
-            if config["music"]["progress"].get() and status == "Playing":
-                try:
-                    pos = subprocess.run(
-                        ["playerctl", "position", "--format", "{{duration(position)}}"],
-                        capture_output=True,
-                        text=True,
-                        timeout=0.5
-                    ).stdout.strip()
-                    dur = subprocess.run(
-                        ["playerctl", "metadata", "--format", "{{duration(mpris:length)}}"],
-                        capture_output=True,
-                        text=True,
-                        timeout=0.5
-                    ).stdout.strip()
-                    if pos and dur:
-                        output += f" {pos}/{dur}"
-                except subprocess.SubprocessError as e:
-                    print(f"Music progress error: {e}")
-            return output
-        print("Empty or invalid metadata")
-        return "⏸️"
-    except (subprocess.SubprocessError, FileNotFoundError) as e:
-        print(f"Music detection error: {e}")
-        return "⏸️"
+        segment = lines[i][j]
+        shorter = elide(segment.text, len(segment.text) - excess) if segment.shrinkable else ""
+        if shorter:
+            lines[i][j] = segment._replace(text=shorter)
+        else:
+            del lines[i][j]
+            if not lines[i]:
+                del lines[i]
+    return "\n".join(" | ".join(s.text for s in line) for line in lines)
 
-def get_current_time(config):
-    """Get current time based on config."""
-    if not config["time"]["enable"].get():
-        return ""
+class ChatboxTemplate:
+    """A user chatbox template compiled into per-segment format pieces.
+
+    Lines are split on newlines (or a literal "\\n"), segments on " | ". A
+    segment is only shown when every field in it has a value, and it takes
+    the priority of its most important field. Each render only formats
+    values; parsing happens once per template string.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.lines = []
+        for line in source.replace("\\n", "\n").split("\n"):
+            segments = []
+            for part in line.split(" | "):
+                pieces = []
+                fields = []
+                for literal, field, spec, conversion in string.Formatter().parse(part):
+                    if field is not None:
+                        if not field.isidentifier():
+                            raise ValueError(f"unsupported field {{{field}}}")
+                        if conversion not in (None, "s", "r", "a"):
+                            raise ValueError(f"unknown conversion !{conversion}")
+                        fields.append(field)
+                    pieces.append((literal, field, spec, conversion))
+                if not part.strip():
+                    continue
+                priority = min((FIELD_PRIORITIES.get(f, DEFAULT_FIELD_PRIORITY) for f in fields),
+                               default=DEFAULT_FIELD_PRIORITY)
+                segments.append((tuple(pieces), priority))
+            self.lines.append(segments)
+
+    @staticmethod
+    def format_value(value, spec, conversion):
+        if conversion == "r":
+            value = repr(value)
+        elif conversion == "a":
+            value = ascii(value)
+        elif conversion == "s":
+            value = str(value)
+        try:
+            return format(value, spec)
+        except (ValueError, TypeError):
+            return str(value)
+
+    def render(self, values):
+        """Return segment lines for fit_layout, skipping segments with missing fields."""
+        lines = []
+        for segments in self.lines:
+            line = []
+            for pieces, priority in segments:
+                parts = []
+                shrinkable = False
+                for literal, field, spec, conversion in pieces:
+                    parts.append(literal)
+                    if field is None:
+                        continue
+                    value = values.get(field)
+                    if value is None or value == "":
+                        break
+                    if isinstance(value, str):
+                        shrinkable = True
+                    parts.append(self.format_value(value, spec, conversion))
+                else:
+                    line.append(Segment("".join(parts).strip(), priority, shrinkable))
+            lines.append(line)
+        return lines
+
+@lru_cache(maxsize=16)
+def compile_template(source):
+    """Compile a template string (cached), or return None for the built-in layout."""
+    if not source.strip():
+        return None
     try:
-        tz = tzlocal.get_localzone()
-        fmt = "%H:%M" if config["time"]["24hour"].get() else "%I:%M %p"
-        time_str = datetime.now(tz).strftime(fmt)
-        if config["time"]["timezone"].get():
-            import time as time_mod
-            tz_name = time_mod.tzname[0]  # e.g., PDT
-            time_str += f" {tz_name}"
-        if config["time"]["prefix"].get():
-            return f"My time: {time_str}"
-        print(f"Time config: 24hour={config['time']['24hour'].get()}, timezone={config['time']['timezone'].get()}, prefix={config['time']['prefix'].get()}")
-        return time_str
-    except Exception as e:
-        print(f"Time error: {e}")
-        return ""
+        return ChatboxTemplate(source)
+    except ValueError as e:
+        log.warning(f"Template error: {e}; using the built-in layout")
+        return None
+
+def template_values(stats, time_str, music_str, config):
+    """Values a template can reference: the stats plus time, music and display helpers."""
+    values = dict(stats)
+    values["time"] = time_str
+    values["music"] = music_str
+    values["temp_unit"] = config.temp_unit.lower()
+    values["avg_window"] = format_window(config.average_window)
+    return values
 
 def build_message(stats, time_str, music_str, chat_text, config):
+    limit = CHATBOX_MAX_CHARS - len(config.suffix)
     if chat_text.strip():
-        return chat_text[:140] + ("\u0003\u001f" if config["skinny_mode"].get() else "")
+        return (elide(chat_text.strip(), 140) or chat_text.strip()[:140]) + config.suffix
+    if config.renderer is not None:
+        lines = config.renderer.render(template_values(stats, time_str, music_str, config))
+        return fit_layout(lines, limit) + config.suffix
     lines = []
-    system_enabled = config["system_stats"]["enable"].get()
+    system_enabled = config.system_enable
     if system_enabled:
-        cpu_usage = config["system_stats"]["cpu_usage"].get()
-        cpu_temp = config["system_stats"]["cpu_temp"].get()
-        gpu_usage = config["system_stats"]["gpu_usage"].get()
-        gpu_temp = config["system_stats"]["gpu_temp"].get()
-        ram_usage = config["system_stats"]["ram_usage"].get()
-        vram_usage = config["system_stats"]["vram_usage"].get()
-        extra_stats = cpu_temp or gpu_temp or ram_usage or vram_usage
-        temp_unit = config["system_stats"]["temp_unit"].get()
-        if not extra_stats and cpu_usage and gpu_usage:
-            lines.append(f"CPU: {stats.get('cpu_usage', 0.0):.1f}% | GPU: {stats.get('gpu_usage', 0.0):.1f}%")
+        cpu_usage = config.cpu_usage
+        cpu_max_core = config.cpu_max_core
+        cpu_temp = config.cpu_temp
+        gpu_usage = config.gpu_usage
+        gpu_temp = config.gpu_temp
+        ram_usage = config.ram_usage
+        vram_usage = config.vram_usage
+        extra_stats = cpu_temp or gpu_temp or ram_usage or vram_usage or config.vrchat_gpu or config.show_average
+        average_label = f"avg {format_window(config.average_window)}"
+        temp_unit = config.temp_unit
+        # In "each" mode every sampled GPU gets its own label; otherwise one summary GPU
+        gpu_entries = stats.get("gpus", []) if config.gpu_display == "each" else []
+        if len(gpu_entries) < 2:
+            gpu_entries = [{"label": "GPU", "usage": stats.get("gpu_usage", 0.0), "temp": stats.get("gpu_temp", 0.0)}]
+        else:
+            gpu_entries = [dict(entry, label=f"GPU{i}") for i, entry in enumerate(gpu_entries, 1)]
+        if not extra_stats and not cpu_max_core and cpu_usage and gpu_usage:
+            lines.append(
+                [Segment(f"CPU: {stats.get('cpu_usage', 0.0):.1f}%", 0, False)]
+                + [Segment(f"{entry['label']}: {entry.get('usage', 0.0):.1f}%", 0, False) for entry in gpu_entries]
+            )
         else:
             if cpu_usage or cpu_temp:
                 cpu_line = []
                 if cpu_usage:
-                    cpu_line.append(f"CPU: {stats.get('cpu_usage', 0.0):.1f}%")
+                    text = f"CPU: {stats.get('cpu_usage', 0.0):.1f}%"
+                    if cpu_max_core:
+                        text += f" (core {stats.get('cpu_max_core', 0.0):.0f}%)"
+                    if config.show_average and "cpu_usage_avg" in stats:
+                        text += f" ({average_label} {stats['cpu_usage_avg']:.0f}%)"
+                    cpu_line.append(Segment(text, 0, False))
                 if cpu_temp:
-                    cpu_line.append(f"Temp: {stats.get('cpu_temp', 0.0):.0f}{temp_unit.lower()}")
-                lines.append(" | ".join(cpu_line))
+                    cpu_line.append(Segment(f"Temp: {stats.get('cpu_temp', 0.0):.0f}{temp_unit.lower()}", 2, False))
+                lines.append(cpu_line)
             if gpu_usage or gpu_temp:
-                gpu_line = []
-                if gpu_usage:
-                    gpu_line.append(f"GPU: {stats.get('gpu_usage', 0.0):.1f}%")
-                if gpu_temp:
-                    gpu_line.append(f"Temp: {stats.get('gpu_temp', 0.0):.0f}{temp_unit.lower()}")
-                lines.append(" | ".join(gpu_line))
+                for entry in gpu_entries:
+                    gpu_line = []
+                    if gpu_usage:
+                        text = f"{entry['label']}: {entry.get('usage', 0.0):.1f}%"
+                        if config.vrchat_gpu and "vrchat_gpu" in stats and entry is gpu_entries[0]:
+                            text += f" (VRChat {stats['vrchat_gpu']:.0f}%)"
+                        if config.show_average and "gpu_usage_avg" in stats and entry["label"] == "GPU":
+                            text += f" ({average_label} {stats['gpu_usage_avg']:.0f}%)"
+                        gpu_line.append(Segment(text, 0, False))
+                    if gpu_temp:
+                        gpu_line.append(Segment(f"Temp: {entry.get('temp', 0.0):.0f}{temp_unit.lower()}", 2, False))
+                    lines.append(gpu_line)
             if ram_usage or vram_usage:
                 ram_line = []
                 if ram_usage:
-                    ram_line.append(f"RAM: {stats.get('ram_used', 0.0)}/{stats.get('ram_total', 0.0)}gb")
+                    ram_line.append(Segment(f"RAM: {stats.get('ram_used', 0.0)}/{stats.get('ram_total', 0.0)}gb", 4, False))
                 if vram_usage:
-                    ram_line.append(f"VRAM: {stats.get('vram_used', 0.0)}/{stats.get('vram_total', 0.0)}gb")
-                lines.append(" | ".join(ram_line))
+                    ram_line.append(Segment(f"VRAM: {stats.get('vram_used', 0.0)}/{stats.get('vram_total', 0.0)}gb", 4, False))
+                lines.append(ram_line)
     if time_str:
-        lines.append(time_str)
+        lines.append([Segment(time_str, FIELD_PRIORITIES["time"], False)])
     if music_str:
-        lines.append(music_str)
-    return "\n".join(lines) + ("\u0003\u001f" if config["skinny_mode"].get() else "")
+        lines.append([Segment(music_str, FIELD_PRIORITIES["music"], True)])
+    return fit_layout(lines, limit) + config.suffix
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+class MetricsExporter:
+    """Serve the latest provider values and hot-path metrics in OpenMetrics format on localhost.
+
+    Scrapes only read the LatestValues table and hot_path_metrics, so they
+    never trigger a sample of their own.
+    """
+
+    def __init__(self, table, get_config):
+        self.table = table
+        self.get_config = get_config
+        self.server = None
+        self.port = None
+
+    def start(self, port):
+        """(Re)bind to 127.0.0.1:port; a falsy port stops the exporter."""
+        port = optional_port(port)
+        if port == self.port and self.server:
+            return
+        self.stop()
+        if not port:
+            return
+        exporter = self
+
+        class Handler(http_server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug("metrics: " + format, *args)
+
+        self.server = http_server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = port
+        threading.Thread(target=self.server.serve_forever, name="metrics-exporter", daemon=True).start()
+        log.info(f"Metrics exporter listening on http://127.0.0.1:{port}/metrics")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        self.server = None
+        self.port = None
+
+    @staticmethod
+    def labels(**labels):
+        if not labels:
+            return ""
+        pairs = ",".join(
+            '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+            for key, value in labels.items()
+        )
+        return "{" + pairs + "}"
+
+    def render(self):
+        config = self.get_config()
+        celsius = (lambda t: (t - 32) * 5 / 9) if config.temp_unit == "F" else (lambda t: t)
+        stats = {}
+        for name in ("cpu", "gpu", "sensors"):
+            stats.update(self.table.get(name))
+        families = {}
+
+        def gauge(name, help_text, value, **labels):
+            if value is None:
+                return
+            family = families.setdefault(name, ["gauge", help_text, []])
+            family[2].append(f"{name}{self.labels(**labels)} {float(value)}")
+
+        gauge("elov_cpu_usage_percent", "Total CPU utilisation.", stats.get("cpu_usage"))
+        gauge("elov_cpu_max_core_percent", "Utilisation of the busiest core.", stats.get("cpu_max_core"))
+        for core, usage in enumerate(stats.get("cpu_cores") or ()):
+            gauge("elov_cpu_core_usage_percent", "Per-core CPU utilisation.", usage, core=core)
+        if "cpu_temp" in stats:
+            gauge("elov_cpu_temp_celsius", "CPU temperature.", celsius(stats["cpu_temp"]))
+        if "ram_used" in stats:
+            gauge("elov_ram_used_bytes", "Used system memory.", stats["ram_used"] * 1024**3)
+            gauge("elov_ram_total_bytes", "Total system memory.", stats["ram_total"] * 1024**3)
+        for gpu in stats.get("gpus", ()):
+            labels = {"bus_id": gpu["bus_id"], "type": gpu["type"], "card": gpu.get("card") or ""}
+            gauge("elov_gpu_usage_percent", "GPU utilisation.", gpu.get("usage"), **labels)
+            if gpu.get("temp") is not None:
+                gauge("elov_gpu_temp_celsius", "GPU temperature.", celsius(gpu["temp"]), **labels)
+            if "vram_used" in gpu:
+                gauge("elov_gpu_vram_used_bytes", "Used video memory.", gpu["vram_used"] * 1024**3, **labels)
+                gauge("elov_gpu_vram_total_bytes", "Total video memory.", gpu["vram_total"] * 1024**3, **labels)
+            gauge("elov_gpu_power_watts", "GPU board power.", gpu.get("power"), **labels)
+            gauge("elov_gpu_clock_mhz", "GPU graphics clock.", gpu.get("clock"), **labels)
+        gauge("elov_vrchat_gpu_percent", "GPU share used by VRChat.", stats.get("vrchat_gpu"))
+        for provider, age in sorted(self.table.ages().items()):
+            gauge("elov_provider_age_seconds", "Seconds since the provider last published.", age,
+                  provider=provider)
+
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.extend(samples)
+
+        stages = hot_path_metrics.snapshot()
+        if stages:
+            lines.append("# TYPE elov_stage_duration_seconds histogram")
+            lines.append("# HELP elov_stage_duration_seconds Latency of each hot-path stage.")
+            for stage, summary in stages.items():
+                cumulative = 0
+                for bound, count in summary["buckets"].items():
+                    cumulative += count
+                    lines.append(f"elov_stage_duration_seconds_bucket{self.labels(stage=stage, le=bound)} {cumulative}")
+                lines.append(f"elov_stage_duration_seconds_count{self.labels(stage=stage)} {summary['count']}")
+                lines.append(f"elov_stage_duration_seconds_sum{self.labels(stage=stage)} {summary['sum']}")
+            for name, key, help_text in (("elov_stage_errors", "errors", "Stage calls that raised."),
+                                         ("elov_stage_timeouts", "timeouts", "Stage calls over their timeout.")):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"# HELP {name} {help_text}")
+                for stage, summary in stages.items():
+                    lines.append(f"{name}_total{self.labels(stage=stage)} {summary[key]}")
+        for name, value in hot_path_metrics.counter_snapshot().items():
+            lines.append(f"# TYPE elov_{name} counter")
+            lines.append(f"# HELP elov_{name} Hot-path event count.")
+            lines.append(f"elov_{name}_total {value}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+def merge_config(defaults, data):
+    """Overlay saved settings on the defaults, ignoring unknown keys and wrong types."""
+    merged = {}
+    for key, default in defaults.items():
+        value = data.get(key, default) if isinstance(data, dict) else default
+        if isinstance(default, dict):
+            merged[key] = merge_config(default, value)
+        elif isinstance(value, type(default)) or (isinstance(default, str) and isinstance(value, (int, float))):
+            merged[key] = str(value) if isinstance(default, str) else value
+        else:
+            merged[key] = default
+    return merged
+
+# Schema version written to the config file; files without one are version 1
+CONFIG_VERSION = 1
+
+# Version -> function upgrading a config dict from that version to the next.
+# Changes merge_config absorbs (new keys, numbers in string settings) need no entry.
+CONFIG_MIGRATIONS = {}
+
+def migrate_config(data):
+    """Upgrade a loaded config dict to CONFIG_VERSION in one pass; returns (data, migrated)."""
+    version = data.get("version", 1)
+    if not isinstance(version, int) or version > CONFIG_VERSION:
+        log.warning(f"Config version {version!r} is newer than supported; reading it as version {CONFIG_VERSION}")
+        return data, False
+    if version < 1:
+        log.warning(f"Config version {version!r} is invalid; reading it as version 1")
+        version = 1
+    migrated = version < CONFIG_VERSION
+    while version < CONFIG_VERSION:
+        step = CONFIG_MIGRATIONS.get(version)
+        if step is None:
+            log.warning(f"No migration from config version {version}; reading it as version {CONFIG_VERSION}")
+            return data, False
+        data = step(data)
+        version += 1
+    return data, migrated
+
+def load_config_file(path=CONFIG_FILE, with_status=False):
+    """Read, migrate and merge the JSON config into a plain dict, falling back to defaults.
+
+    With with_status, also return whether the file was migrated and should be rewritten.
+    """
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {"version": CONFIG_VERSION}
+    except json.JSONDecodeError as e:
+        log.warning(f"Config load error: {e}")
+        data = {"version": CONFIG_VERSION}
+    if not isinstance(data, dict):
+        log.warning(f"Config load error: Expected dictionary, got {type(data)}")
+        data = {"version": CONFIG_VERSION}
+    data, migrated = migrate_config(data)
+    merged = merge_config(CONFIG_DEFAULTS, data)
+    return (merged, migrated) if with_status else merged
+
+def write_config_atomic(path, data):
+    """Write the config to a temp file and rename it over the old one, so a crash never leaves half a file.
+
+    The temp file name is unique, so two instances saving at once never share
+    it, and the directory is synced after the rename so the rename itself is
+    durable.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(dict(data, version=CONFIG_VERSION), f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+class ConfigWriter:
+    """Debounced write-behind for the config file.
+
+    mark_dirty() only records the newest config dict; a background thread
+    writes it atomically once no change has come in for `delay` seconds.
+    """
+
+    def __init__(self, path=CONFIG_FILE, delay=0.5):
+        self.path = path
+        self.delay = delay
+        self.cond = threading.Condition()
+        self.pending = None
+        self.deadline = 0.0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="config-writer", daemon=True)
+        self.thread.start()
+
+    def mark_dirty(self, data):
+        with self.cond:
+            self.pending = data
+            self.deadline = time.monotonic() + self.delay
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and (self.pending is None or time.monotonic() < self.deadline):
+                    self.cond.wait(None if self.pending is None else self.deadline - time.monotonic())
+                if not self.running:
+                    return
+                data, self.pending = self.pending, None
+            self.write(data)
+
+    def write(self, data):
+        try:
+            write_config_atomic(self.path, data)
+        except OSError as e:
+            log.warning(f"Config save error: {e}")
+
+    def close(self):
+        """Write any pending change now and stop the writer."""
+        with self.cond:
+            self.running = False
+            data, self.pending = self.pending, None
+            self.cond.notify()
+        self.thread.join(1.0)
+        if data is not None:
+            self.write(data)
+
+class HeadlessRunner:
+    """Run the stats/time/music/chat pipeline and OSC output without Tk."""
+
+    def __init__(self, config_path=CONFIG_FILE, chat_stdin=False, metrics_file=None):
+        self.config_path = config_path
+        self.metrics_file = metrics_file
+        self.snapshot = ConfigSnapshot(load_config_file(config_path))
+        watch_gpu_topology(self.on_gpu_change)
+        self.chat_stdin = chat_stdin
+        self.last_chat = ""
+        self.last_chat_time = None
+        self.running = True
+        self.history = MetricsHistory()
+        self.avatar = AvatarParameterCache()
+        self.sender = ChatboxSender()
+        self.sender.configure(*self.send_rate())
+        self.sender.client = OscFanout()
+        self.sender.client.configure(osc_destinations(self.snapshot))
+        self.scheduler = ProviderScheduler()
+        register_providers(self.scheduler, lambda: self.snapshot, self.get_gpus, lambda: "")
+
+    def on_gpu_change(self, gpus, primary):
+        self.gpus, self.detected_gpu = gpus, primary
+
+    def get_gpus(self):
+        return self.gpus, pick_primary_gpu(self.gpus, self.detected_gpu, self.snapshot.primary_gpu)
+
+    def send_rate(self):
+        try:
+            return float(self.snapshot.send_interval), int(self.snapshot.send_burst)
+        except ValueError:
+            return 1.5, 3
+
+    def read_chat(self):
+        """Send each line from stdin as a chat message."""
+        for line in sys.stdin:
+            text = line.strip()[:140]
+            if text:
+                self.last_chat = text
+                self.last_chat_time = time.monotonic()
+                self.sender.submit(text + self.snapshot.suffix, ChatboxSender.PRIORITY_CHAT, force=True)
+
+    def recent_chat(self):
+        if self.last_chat_time and time.monotonic() - self.last_chat_time < self.snapshot.chat_timeout:
+            return self.last_chat
+        self.last_chat_time = None
+        return ""
+
+    def run(self):
+        """Send chatbox updates until interrupted."""
+        scheduler = self.scheduler
+        scheduler.start()
+        exporter = MetricsExporter(scheduler.table, lambda: self.snapshot)
+        try:
+            exporter.start(self.snapshot.metrics_port)
+        except (ValueError, OSError) as e:
+            log.warning(f"Metrics exporter error: {e}")
+        receiver = OscReceiver(self.avatar)
+        try:
+            receiver.start(self.snapshot.osc_input_port if self.snapshot.osc_input_enable else None)
+        except ValueError as e:
+            log.warning(f"Invalid OSC input port: {e}")
+        avatar_sender = AvatarParameterSender(scheduler.table, lambda: self.snapshot, lambda: self.sender.client)
+        avatar_sender.start()
+        if self.chat_stdin:
+            threading.Thread(target=self.read_chat, daemon=True).start()
+        log.info("Running headless; press Ctrl+C to stop")
+        clock = TickClock(self.snapshot.update_period)
+        try:
+            while self.running:
+                self.tick()
+                clock.wait(self.snapshot.update_period)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.stop()
+            exporter.stop()
+            receiver.stop()
+            avatar_sender.stop()
+            self.sender.stop()
+            if self.metrics_file:
+                hot_path_metrics.dump(self.metrics_file)
+            if nvidia_monitor:
+                nvidia_monitor.stop()
+            for monitor in radeontop_monitors.values():
+                monitor.stop()
+
+    def tick(self):
+        """Build one chatbox update from the latest provider values and queue it.
+
+        Returns the message, or None while stats are paused by an avatar parameter.
+        """
+        config = self.snapshot
+        recent_chat = self.recent_chat()
+        if not recent_chat and self.avatar.any_active(config.pause_on):
+            return None
+        start_time = time.monotonic()
+        with hot_path_metrics.stage("collect"):
+            stats, time_str, music_str, chat_text = collect_tick(
+                self.scheduler.table, config, recent_chat, self.history, self.avatar
+            )
+        with hot_path_metrics.stage("build_message"):
+            message = build_message(stats, time_str, music_str, chat_text, config)
+        self.sender.submit(message)
+        elapsed = time.monotonic() - start_time
+        hot_path_metrics.observe("tick", elapsed, timeout=elapsed > config.update_period)
+        return message
+
+    def once(self, send=True):
+        """Sample every provider once and return the result as a dict."""
+        config = self.snapshot
+        if config.music_enable:
+            get_music_provider().ready.wait(1.0)
+        if config.system_enable and config.cpu_usage:
+            # The first /proc/stat read has no previous tick to diff against
+            cpu_sampler.sample()
+            time.sleep(0.25)
+        stats = get_system_stats(*self.get_gpus(), config) if config.system_enable else {}
+        time_str = get_current_time(config)
+        music_str = get_music_info(config)
+        message = build_message(stats, time_str, music_str, "", config)
+        if send:
+            self.sender.client.resolve_pending()  # the background lookup may not have finished yet
+            self.sender.client.send_message("/chatbox/input", [message, True, False])
+        return {"stats": stats, "time": time_str, "music": music_str, "message": message}
+
+class ChatHistoryStore:
+    """Sent chat messages in SQLite, with pinned favourites and full-text search.
+
+    Uses an FTS5 index when the SQLite build has it and falls back to LIKE
+    otherwise. Pinned messages sort first, then newest first. If the file
+    cannot be opened (corrupt, unwritable), history is kept in memory for
+    the session instead.
+    """
+
+    def __init__(self, path=CHAT_DB_FILE):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.open(path)
+        except (sqlite3.Error, OSError) as e:
+            log.warning(f"Chat history unavailable ({e}); keeping it in memory for this session")
+            self.open(":memory:")
+        self.total = self.db.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    def open(self, path):
+        self.db = sqlite3.connect(path)
+        try:
+            self.create_schema()
+        except sqlite3.Error:
+            self.db.close()
+            raise
+
+    def create_schema(self):
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                text TEXT NOT NULL,
+                sent_at REAL NOT NULL,
+                pinned INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS messages_order ON messages (pinned, id);
+        """)
+        try:
+            self.db.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+                    USING fts5(text, content='messages', content_rowid='id');
+                CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END;
+            """)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            log.info(f"SQLite FTS5 unavailable ({e}); chat search uses LIKE")
+            self.fts = False
+        self.db.commit()
+
+    def add(self, text):
+        cursor = self.db.execute("INSERT INTO messages (text, sent_at) VALUES (?, ?)", (text, time.time()))
+        self.db.commit()
+        self.total += 1
+        return cursor.lastrowid
+
+    def set_pinned(self, message_id, pinned):
+        self.db.execute("UPDATE messages SET pinned = ? WHERE id = ?", (int(pinned), message_id))
+        self.db.commit()
+
+    def where(self, query, pinned_only):
+        clauses, params = [], []
+        if query:
+            if self.fts:
+                # Each word is matched as a quoted prefix, so user input is never FTS syntax
+                terms = " ".join('"{}"*'.format(word.replace('"', '""')) for word in query.split())
+                clauses.append("id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+                params.append(terms)
+            else:
+                for word in query.split():
+                    clauses.append("text LIKE ? ESCAPE '\\'")
+                    params.append("%" + re.sub(r"([%_\\])", r"\\\1", word) + "%")
+        if pinned_only:
+            clauses.append("pinned = 1")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, query="", pinned_only=False):
+        if not query and not pinned_only:
+            return self.total
+        where, params = self.where(query, pinned_only)
+        return self.db.execute(f"SELECT count(*) FROM messages{where}", params).fetchone()[0]
+
+    def page(self, offset, limit, query="", pinned_only=False):
+        """Return (id, text, pinned) rows for one screenful."""
+        where, params = self.where(query, pinned_only)
+        return self.db.execute(
+            f"SELECT id, text, pinned FROM messages{where} ORDER BY pinned DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+
+    def close(self):
+        self.db.close()
+
+class ChatHistoryList:
+    """Chat history view with a fixed pool of row widgets.
+
+    Only the visible rows exist; scrolling, searching and new messages just
+    re-query one page from the store and relabel those rows.
+    """
+
+    ROWS = 8
+
+    def __init__(self, parent, store, on_resend, on_copy):
+        self.store = store
+        self.on_resend = on_resend
+        self.on_copy = on_copy
+        self.offset = 0
+        self.total = 0
+        self.query = tk.StringVar(value="")
+        self.pinned_only = tk.BooleanVar(value=False)
+
+        search_row = ttk.Frame(parent)
+        search_row.pack(fill="x", pady=2)
+        ttk.Label(search_row, text="Search:").pack(side="left", padx=5)
+        ttk.Entry(search_row, textvariable=self.query).pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Checkbutton(
+            search_row, text="Pinned Only", variable=self.pinned_only, command=self.reset
+        ).pack(side="left", padx=5)
+        self.query.trace_add("write", lambda *args: self.reset())
+
+        body = ttk.Frame(parent)
+        body.pack(fill="both", expand=True)
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        rows_frame = ttk.Frame(body)
+        rows_frame.pack(side="left", fill="both", expand=True)
+        rows_frame.columnconfigure(0, weight=1)
+        self.rows = []
+        for index in range(self.ROWS):
+            label = ttk.Label(rows_frame, text="", wraplength=300, anchor="w")
+            pin = ttk.Button(rows_frame, text="☆", width=2)
+            copy = ttk.Button(rows_frame, text="Copy")
+            resend = ttk.Button(rows_frame, text="Resend")
+            for column, widget in enumerate((label, pin, copy, resend)):
+                widget.grid(row=index, column=column, sticky="we" if column == 0 else "e", padx=2, pady=2)
+                widget.bind("<Button-4>", lambda e: self.scroll(-1))
+                widget.bind("<Button-5>", lambda e: self.scroll(1))
+            self.rows.append((label, pin, copy, resend))
+        for widget in (rows_frame, body):
+            widget.bind("<Button-4>", lambda e: self.scroll(-1))
+            widget.bind("<Button-5>", lambda e: self.scroll(1))
+        self.refresh()
+
+    def reset(self):
+        self.offset = 0
+        self.refresh()
+
+    def added(self):
+        """A message was stored; only the top page needs redrawing."""
+        if self.offset == 0:
+            self.refresh()
+        else:
+            self.total = self.store.count(self.query.get().strip(), self.pinned_only.get())
+            self.update_scrollbar()
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * self.total)
+        elif action == "scroll":
+            self.offset += int(amount) * (self.ROWS if unit == "pages" else 1)
+        self.refresh()
+
+    def refresh(self):
+        query = self.query.get().strip()
+        pinned_only = self.pinned_only.get()
+        self.total = self.store.count(query, pinned_only)
+        self.offset = max(0, min(self.offset, self.total - self.ROWS))
+        entries = self.store.page(self.offset, self.ROWS, query, pinned_only)
+        for index, widgets in enumerate(self.rows):
+            if index < len(entries):
+                message_id, text, pinned = entries[index]
+                label, pin, copy, resend = widgets
+                label.config(text=text)
+                pin.config(text="★" if pinned else "☆",
+                           command=lambda i=message_id, p=pinned: self.toggle_pin(i, not p))
+                copy.config(command=lambda t=text: self.on_copy(t))
+                resend.config(command=lambda t=text: self.on_resend(t))
+                for widget in widgets:
+                    widget.grid()
+            else:
+                for widget in widgets:
+                    widget.grid_remove()
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        if self.total <= self.ROWS:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / self.total, min(self.offset + self.ROWS, self.total) / self.total)
+
+    def toggle_pin(self, message_id, pinned):
+        self.store.set_pinned(message_id, pinned)
+        self.refresh()
 
 class VRChatOSCApp:
     def __init__(self, root):
@@ -438,142 +3465,178 @@ class VRChatOSCApp:
         try:
             os.makedirs(CONFIG_DIR, exist_ok=True)
             os.chmod(CONFIG_DIR, 0o755)
-            print(f"Config directory ensured: {CONFIG_DIR}")
+            log.info(f"Config directory ensured: {CONFIG_DIR}")
         except OSError as e:
-            print(f"Error creating config directory {CONFIG_DIR}: {e}")
+            log.warning(f"Error creating config directory {CONFIG_DIR}: {e}")
 
-        # Download and set heart icon
-        try:
-            if not os.path.exists(ICON_PATH):
-                req = urllib.request.Request(
-                    ICON_URL,
-                    headers={"User-Agent": "Mozilla/5.0"}
-                )
-                with urllib.request.urlopen(req) as response:
-                    with open(ICON_PATH, "wb") as f:
-                        f.write(response.read())
-                print(f"Downloaded heart icon to {ICON_PATH}")
-            icon = tk.PhotoImage(file=ICON_PATH)
-            self.root.iconphoto(True, icon)
-            print(f"Loaded heart icon from {ICON_PATH}")
-        except Exception as e:
-            print(f"Error loading icon from {ICON_PATH}: {e}. Using default icon.")
-
-        self.config = {
-            "system_stats": {
-                "enable": tk.BooleanVar(value=True),
-                "cpu_usage": tk.BooleanVar(value=True),
-                "cpu_temp": tk.BooleanVar(value=False),
-                "gpu_usage": tk.BooleanVar(value=True),
-                "gpu_temp": tk.BooleanVar(value=False),
-                "ram_usage": tk.BooleanVar(value=False),
-                "vram_usage": tk.BooleanVar(value=False),
-                "temp_unit": tk.StringVar(value="C"),
-            },
-            "time": {
-                "enable": tk.BooleanVar(value=True),
-                "prefix": tk.BooleanVar(value=True),
-                "timezone": tk.BooleanVar(value=False),
-                "short_tz": tk.BooleanVar(value=False),
-                "24hour": tk.BooleanVar(value=False),
-            },
-            "music": {
-                "enable": tk.BooleanVar(value=True),
-                "progress": tk.BooleanVar(value=False),
-                "prefix": tk.StringVar(value="emoji"),
-            },
-            "skinny_mode": tk.BooleanVar(value=True),
-            "app": {
-                "ip": tk.StringVar(value="127.0.0.1"),
-                "port": tk.StringVar(value="9000"),
-            },
-            "chat_timeout": tk.StringVar(value="5")
-        }
+        # Set heart icon; only fetched (in the background) if no local copy exists
+        self.icon = None
+        self.icon_fetched = threading.Event()
+        if os.path.exists(ICON_PATH):
+            self.set_icon(ICON_PATH)
+        elif os.path.exists(BUNDLED_ICON_PATH):
+            self.set_icon(BUNDLED_ICON_PATH)
+        else:
+            threading.Thread(target=self.fetch_icon, daemon=True).start()
+            self.root.after(250, self.apply_fetched_icon)
+
+        self.config = self.create_config_vars(CONFIG_DEFAULTS)
         self.chat_text = tk.StringVar(value="")
         self.live_edit = tk.BooleanVar(value=False)
-        self.chat_history = []
+        self.last_chat = ""
+        self.chat_store = ChatHistoryStore(CHAT_DB_FILE)
         self.program_running = tk.BooleanVar(value=True)
         self.osc_client = None
         self.last_chat_time = None
+        self.sender = ChatboxSender()
+        self.config_writer = ConfigWriter(CONFIG_FILE)
+        with startup_profiler.phase("config load"):
+            self.load_config()
         self.update_osc_client()
-        self.load_config()
-        self.setup_gui()
-        self.gpu = select_primary_gpu()
+        self.refresh_snapshot()
+        self.watch_config(self.config)
+        self.live_chat = ""
+        self.program_on = True
+        for var in (self.chat_text, self.live_edit, self.program_running):
+            var.trace_add("write", self.on_runtime_change)
+        self.update_send_rate()
+        self.preview_queue = queue.Queue()
+        self.history = MetricsHistory()
+        watch_gpu_topology(self.on_gpu_change)
+        with startup_profiler.phase("gui construction"):
+            self.setup_gui()
+        self.root.after(100, self.drain_preview)
+        self.scheduler = ProviderScheduler()
+        register_providers(self.scheduler, lambda: self.snapshot, self.get_gpus, self.get_live_chat)
+        self.scheduler.start()
+        self.exporter = MetricsExporter(self.scheduler.table, lambda: self.snapshot)
+        self.update_exporter()
+        self.avatar = AvatarParameterCache()
+        self.receiver = OscReceiver(self.avatar)
+        self.update_receiver()
+        self.avatar_sender = AvatarParameterSender(
+            self.scheduler.table, lambda: self.snapshot, lambda: self.sender.client
+        )
+        self.avatar_sender.start()
         self.running = True
         self.osc_thread = threading.Thread(target=self.send_osc_messages, daemon=True)
         self.osc_thread.start()
 
     def update_osc_client(self):
-        """Update OSC client with current IP/port."""
+        """Point the OSC fan-out at the current IP/port and extra destinations."""
+        destinations = osc_destinations(ConfigSnapshot(config_to_dict(self.config)))
+        if self.osc_client is None:
+            self.osc_client = OscFanout()
+        self.osc_client.configure(destinations)
+        self.sender.client = self.osc_client
+
+    def update_send_rate(self):
+        """Apply the chatbox rate limit settings to the send queue."""
         try:
-            ip = self.config["app"]["ip"].get()
-            port = int(self.config["app"]["port"].get())
-            self.osc_client = udp_client.SimpleUDPClient(ip, port)
-            print(f"OSC client updated: {ip}:{port}")
+            interval = float(self.config["app"]["send_interval"].get())
+            burst = int(self.config["app"]["send_burst"].get())
+            self.sender.configure(interval, burst)
+            log.info(f"Chatbox rate limit: {burst} burst, 1 per {interval}s")
         except ValueError as e:
-            print(f"Invalid IP/port: {e}")
+            log.warning(f"Invalid rate limit: {e}")
 
-    def load_config(self):
-        """Load config from JSON file."""
+    def update_exporter(self):
+        """Start, move or stop the metrics exporter to match the configured port."""
         try:
-            with open(CONFIG_FILE, "r") as f:
-                data = json.load(f)
-            if not isinstance(data, dict):
-                print(f"Config load error: Expected dictionary, got {type(data)}")
-                return
-            for section, settings in data.items():
-                if section in ["skinny_mode", "chat_timeout"]:
-                    if section == "skinny_mode" and isinstance(settings, bool):
-                        self.config["skinny_mode"].set(settings)
-                    elif section == "chat_timeout" and isinstance(settings, str):
-                        self.config["chat_timeout"].set(settings)
-                elif section in self.config and isinstance(settings, dict):
-                    for key, value in settings.items():
-                        if key in self.config[section]:
-                            self.config[section][key].set(value)
-        except FileNotFoundError:
-            pass
-        except json.JSONDecodeError as e:
-            print(f"Config load error: {e}")
+            self.exporter.start(self.config["app"]["metrics_port"].get().strip())
+        except (ValueError, OSError) as e:
+            log.warning(f"Metrics exporter error: {e}")
 
-    def save_config(self):
-        """Save config to JSON file."""
-        data = {
-            "system_stats": {
-                "enable": self.config["system_stats"]["enable"].get(),
-                "cpu_usage": self.config["system_stats"]["cpu_usage"].get(),
-                "cpu_temp": self.config["system_stats"]["cpu_temp"].get(),
-                "gpu_usage": self.config["system_stats"]["gpu_usage"].get(),
-                "gpu_temp": self.config["system_stats"]["gpu_temp"].get(),
-                "ram_usage": self.config["system_stats"]["ram_usage"].get(),
-                "vram_usage": self.config["system_stats"]["vram_usage"].get(),
-                "temp_unit": self.config["system_stats"]["temp_unit"].get(),
-            },
-            "time": {
-                "enable": self.config["time"]["enable"].get(),
-                "prefix": self.config["time"]["prefix"].get(),
-                "timezone": self.config["time"]["timezone"].get(),
-                "short_tz": self.config["time"]["short_tz"].get(),
-                "24hour": self.config["time"]["24hour"].get(),
-            },
-            "music": {
-                "enable": self.config["music"]["enable"].get(),
-                "progress": self.config["music"]["progress"].get(),
-                "prefix": self.config["music"]["prefix"].get(),
-            },
-            "skinny_mode": self.config["skinny_mode"].get(),
-            "app": {
-                "ip": self.config["app"]["ip"].get(),
-                "port": self.config["app"]["port"].get(),
-            },
-            "chat_timeout": self.config["chat_timeout"].get()
-        }
+    def update_receiver(self):
+        """Start, move or stop the VRChat OSC listener to match the OSC input settings."""
         try:
-            with open(CONFIG_FILE, "w") as f:
-                json.dump(data, f, indent=4)
-            os.chmod(CONFIG_FILE, 0o644)
-        except IOError as e:
-            print(f"Config save error: {e}")
+            enabled = self.config["osc_input"]["enable"].get()
+            self.receiver.start(self.config["osc_input"]["port"].get().strip() if enabled else None)
+            if not enabled:
+                self.avatar.clear()
+        except ValueError as e:
+            log.warning(f"Invalid OSC input port: {e}")
+
+    def set_icon(self, path):
+        """Set the window icon from a PNG file."""
+        try:
+            self.icon = tk.PhotoImage(file=path)
+            self.root.iconphoto(True, self.icon)
+            log.info(f"Loaded heart icon from {path}")
+        except tk.TclError as e:
+            log.warning(f"Error loading icon from {path}: {e}. Using default icon.")
+
+    def fetch_icon(self):
+        """Download the heart icon into CONFIG_DIR (runs off the Tk thread)."""
+        try:
+            req = urllib_request.Request(
+                ICON_URL,
+                headers={"User-Agent": "Mozilla/5.0"}
+            )
+            with urllib_request.urlopen(req, timeout=10) as response:
+                with open(ICON_PATH, "wb") as f:
+                    f.write(response.read())
+            log.info(f"Downloaded heart icon to {ICON_PATH}")
+        except Exception as e:
+            log.warning(f"Error downloading icon: {e}. Using default icon.")
+        finally:
+            self.icon_fetched.set()
+
+    def apply_fetched_icon(self):
+        """Poll for the background icon download and apply it on the Tk thread."""
+        if not self.icon_fetched.is_set():
+            self.root.after(250, self.apply_fetched_icon)
+        elif os.path.exists(ICON_PATH):
+            self.set_icon(ICON_PATH)
+
+    def create_config_vars(self, defaults):
+        """Create Tk variables mirroring a (nested) dict of default settings."""
+        config = {}
+        for key, value in defaults.items():
+            if isinstance(value, dict):
+                config[key] = self.create_config_vars(value)
+            elif isinstance(value, bool):
+                config[key] = tk.BooleanVar(value=value)
+            else:
+                config[key] = tk.StringVar(value=value)
+        return config
+
+    def watch_config(self, config):
+        """Rebuild the config snapshot whenever any setting changes."""
+        for value in config.values():
+            if isinstance(value, dict):
+                self.watch_config(value)
+            else:
+                value.trace_add("write", lambda *args: self.refresh_snapshot())
+
+    def refresh_snapshot(self):
+        """Compile the Tk variables into a new immutable snapshot for the workers."""
+        self.config_data = config_to_dict(self.config)
+        self.snapshot = ConfigSnapshot(self.config_data)
+
+    def on_runtime_change(self, *args):
+        """Mirror the chat/program toggles into plain attributes for the worker threads."""
+        self.live_chat = self.chat_text.get().strip() if self.live_edit.get() else ""
+        self.program_on = self.program_running.get()
+
+    def load_config(self):
+        """Load, migrate and apply the saved config in one pass."""
+        data, migrated = load_config_file(CONFIG_FILE, with_status=True)
+        self.apply_config(self.config, data)
+        if migrated:
+            self.config_writer.mark_dirty(data)
+
+    def apply_config(self, config, data):
+        """Set a (nested) dict of Tk variables from a merged config dict."""
+        for key, var in config.items():
+            if isinstance(var, dict):
+                self.apply_config(var, data[key])
+            else:
+                var.set(data[key])
+
+    def save_config(self):
+        """Mark the config dirty; the writer saves it in the background once changes settle."""
+        self.config_writer.mark_dirty(self.config_data)
 
     def setup_gui(self):
         """Setup GUI with tabs and preview."""
@@ -604,6 +3667,8 @@ class VRChatOSCApp:
             bg="#3C3C3C", fg="#E0E0E0", insertbackground="#E0E0E0"
         )
         self.preview_text.pack(pady=5)
+        self.sparkline_label = ttk.Label(right_panel, text="", anchor="w", justify="left")
+        self.sparkline_label.pack(fill="x")
         ttk.Checkbutton(
             right_panel, text="Program On/Off", variable=self.program_running
         ).pack(pady=5)
@@ -634,6 +3699,7 @@ class VRChatOSCApp:
         notebook.add(chat_frame, text="Chat")
         self.history_frame = ttk.Frame(chat_frame)
         self.history_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        self.history_list = ChatHistoryList(self.history_frame, self.chat_store, self.resend_chat, self.copy_chat)
         input_frame = ttk.Frame(chat_frame)
         input_frame.pack(fill="x", padx=10, pady=5)
         ttk.Checkbutton(
@@ -669,6 +3735,46 @@ class VRChatOSCApp:
         port_entry = ttk.Entry(app_frame, textvariable=self.config["app"]["port"], width=8)
         port_entry.pack(side="left", padx=5)
         port_entry.bind("<Return>", lambda e: [self.update_osc_client(), self.save_config()])
+        ttk.Label(app_frame, text="Also send to:").pack(side="left", padx=5)
+        destinations_entry = ttk.Entry(app_frame, textvariable=self.config["app"]["destinations"], width=30)
+        destinations_entry.pack(side="left", padx=5)
+        destinations_entry.bind("<Return>", lambda e: [self.update_osc_client(), self.save_config()])
+
+        # OSC Input
+        osc_input_frame = ttk.LabelFrame(settings_frame, text="OSC Input")
+        osc_input_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Checkbutton(
+            osc_input_frame, text="Listen to VRChat", variable=self.config["osc_input"]["enable"],
+            command=lambda: [self.update_receiver(), self.save_config()]
+        ).pack(side="left", padx=5)
+        ttk.Label(osc_input_frame, text="Port:").pack(side="left", padx=5)
+        listen_entry = ttk.Entry(osc_input_frame, textvariable=self.config["osc_input"]["port"], width=8)
+        listen_entry.pack(side="left", padx=5)
+        listen_entry.bind("<Return>", lambda e: [self.update_receiver(), self.save_config()])
+        ttk.Label(osc_input_frame, text="Pause stats while:").pack(side="left", padx=5)
+        pause_entry = ttk.Entry(osc_input_frame, textvariable=self.config["osc_input"]["pause_on"], width=16)
+        pause_entry.pack(side="left", padx=5)
+        pause_entry.bind("<Return>", lambda e: self.save_config())
+
+        # Avatar Parameters
+        avatar_frame = ttk.LabelFrame(settings_frame, text="Avatar Parameters")
+        avatar_frame.pack(fill="x", padx=10, pady=5)
+        avatar_row = ttk.Frame(avatar_frame)
+        avatar_row.pack(anchor="w", padx=5, pady=2)
+        ttk.Checkbutton(
+            avatar_row, text="Send Stats to Avatar", variable=self.config["avatar_output"]["enable"],
+            command=self.save_config
+        ).pack(side="left")
+        ttk.Label(avatar_row, text="Rate (Hz):").pack(side="left", padx=5)
+        rate_entry = ttk.Entry(avatar_row, textvariable=self.config["avatar_output"]["rate"], width=4)
+        rate_entry.pack(side="left", padx=5)
+        rate_entry.bind("<Return>", lambda e: self.save_config())
+        ttk.Label(
+            avatar_frame, text="Mapping (metric=Parameter[:low:high[:deadband]], ...):"
+        ).pack(anchor="w", padx=5)
+        mapping_entry = ttk.Entry(avatar_frame, textvariable=self.config["avatar_output"]["mapping"], width=60)
+        mapping_entry.pack(anchor="w", padx=5, pady=2)
+        mapping_entry.bind("<Return>", lambda e: self.save_config())
 
         # System Stats Section
         system_frame = ttk.LabelFrame(settings_frame, text="System Stats")
@@ -677,6 +3783,24 @@ class VRChatOSCApp:
             system_frame, text="CPU Usage", variable=self.config["system_stats"]["cpu_usage"],
             command=self.save_config
         ).pack(anchor="w", padx=5, pady=2)
+        ttk.Checkbutton(
+            system_frame, text="Smooth CPU Usage", variable=self.config["system_stats"]["cpu_smoothing"],
+            command=self.save_config
+        ).pack(anchor="w", padx=5, pady=2)
+        ttk.Checkbutton(
+            system_frame, text="Busiest CPU Core", variable=self.config["system_stats"]["cpu_max_core"],
+            command=self.save_config
+        ).pack(anchor="w", padx=5, pady=2)
+        average_frame = ttk.Frame(system_frame)
+        average_frame.pack(anchor="w", padx=5, pady=2)
+        ttk.Checkbutton(
+            average_frame, text="Show Average over (seconds):", variable=self.config["system_stats"]["show_average"],
+            command=self.save_config
+        ).pack(side="left")
+        window_entry = ttk.Entry(average_frame, textvariable=self.config["system_stats"]["average_window"], width=5)
+        window_entry.pack(side="left", padx=5)
+        window_entry.bind("<Return>", lambda e: self.save_config())
+        window_entry.config(validate="key", validatecommand=(self.root.register(self.validate_timeout), "%P"))
         ttk.Checkbutton(
             system_frame, text="CPU Temp", variable=self.config["system_stats"]["cpu_temp"],
             command=self.save_config
@@ -689,6 +3813,10 @@ class VRChatOSCApp:
             system_frame, text="GPU Temp", variable=self.config["system_stats"]["gpu_temp"],
             command=self.save_config
         ).pack(anchor="w", padx=5, pady=2)
+        ttk.Checkbutton(
+            system_frame, text="VRChat GPU Share", variable=self.config["system_stats"]["vrchat_gpu"],
+            command=self.save_config
+        ).pack(anchor="w", padx=5, pady=2)
         ttk.Checkbutton(
             system_frame, text="RAM Usage", variable=self.config["system_stats"]["ram_usage"],
             command=self.save_config
@@ -707,6 +3835,28 @@ class VRChatOSCApp:
             temp_frame, text="°F", variable=self.config["system_stats"]["temp_unit"], value="F",
             command=self.save_config
         ).pack(side="left", padx=10)
+        gpu_frame = ttk.Frame(system_frame)
+        gpu_frame.pack(anchor="w", padx=5, pady=2)
+        ttk.Label(gpu_frame, text="GPU Display:").pack(side="left")
+        for text, value in (("Primary", "primary"), ("Busiest", "busiest"),
+                            ("Average", "aggregate"), ("Each", "each")):
+            ttk.Radiobutton(
+                gpu_frame, text=text, variable=self.config["system_stats"]["gpu_display"], value=value,
+                command=self.save_config
+            ).pack(side="left", padx=5)
+        primary_frame = ttk.Frame(system_frame)
+        primary_frame.pack(anchor="w", padx=5, pady=2)
+        ttk.Label(primary_frame, text="Primary GPU:").pack(side="left")
+        primary_box = ttk.Combobox(
+            primary_frame, textvariable=self.config["system_stats"]["primary_gpu"], width=10,
+            values=["auto"] + [gpu["bus_id"] for gpu in self.gpus], state="readonly"
+        )
+        primary_box.pack(side="left", padx=5)
+        primary_box.bind("<<ComboboxSelected>>", lambda e: self.save_config())
+        ttk.Label(primary_frame, text="Only GPUs (bus IDs):").pack(side="left", padx=5)
+        selected_entry = ttk.Entry(primary_frame, textvariable=self.config["system_stats"]["gpu_selected"], width=16)
+        selected_entry.pack(side="left", padx=5)
+        selected_entry.bind("<Return>", lambda e: self.save_config())
 
         # Time Section
         time_frame = ttk.LabelFrame(settings_frame, text="Time")
@@ -758,6 +3908,50 @@ class VRChatOSCApp:
         timeout_entry.pack(anchor="w", padx=5, pady=2)
         timeout_entry.bind("<Return>", lambda e: self.save_config())
         timeout_entry.config(validate="key", validatecommand=(self.root.register(self.validate_timeout), "%P"))
+        rate_frame = ttk.Frame(extras_frame)
+        rate_frame.pack(anchor="w", padx=5, pady=2)
+        ttk.Label(rate_frame, text="Rate Limit (seconds/message):").pack(side="left")
+        interval_entry = ttk.Entry(rate_frame, textvariable=self.config["app"]["send_interval"], width=5)
+        interval_entry.pack(side="left", padx=5)
+        interval_entry.bind("<Return>", lambda e: [self.update_send_rate(), self.save_config()])
+        interval_entry.config(validate="key", validatecommand=(self.root.register(self.validate_timeout), "%P"))
+        ttk.Label(rate_frame, text="Burst:").pack(side="left")
+        burst_entry = ttk.Entry(rate_frame, textvariable=self.config["app"]["send_burst"], width=3)
+        burst_entry.pack(side="left", padx=5)
+        burst_entry.bind("<Return>", lambda e: [self.update_send_rate(), self.save_config()])
+        period_frame = ttk.Frame(extras_frame)
+        period_frame.pack(anchor="w", padx=5, pady=2)
+        ttk.Label(period_frame, text="Update Period (seconds):").pack(side="left")
+        period_entry = ttk.Entry(period_frame, textvariable=self.config["app"]["update_period"], width=5)
+        period_entry.pack(side="left", padx=5)
+        period_entry.bind("<Return>", lambda e: self.save_config())
+        period_entry.config(validate="key", validatecommand=(self.root.register(self.validate_timeout), "%P"))
+        metrics_frame = ttk.Frame(extras_frame)
+        metrics_frame.pack(anchor="w", padx=5, pady=2)
+        ttk.Label(metrics_frame, text="Metrics Port (localhost, blank = off):").pack(side="left")
+        metrics_entry = ttk.Entry(metrics_frame, textvariable=self.config["app"]["metrics_port"], width=6)
+        metrics_entry.pack(side="left", padx=5)
+        metrics_entry.bind("<Return>", lambda e: [self.update_exporter(), self.save_config()])
+        ttk.Label(
+            extras_frame, text="Chatbox Template (blank = built-in layout; \\n = new line, \" | \" = field):"
+        ).pack(anchor="w", padx=5, pady=2)
+        template_entry = ttk.Entry(extras_frame, textvariable=self.config["template"], width=48)
+        template_entry.pack(anchor="w", padx=5, pady=2)
+        template_entry.bind("<Return>", lambda e: self.save_config())
+
+        # Diagnostics Tab
+        diagnostics_frame = ttk.Frame(notebook)
+        notebook.add(diagnostics_frame, text="Diagnostics")
+        ttk.Label(diagnostics_frame, text="Hot-path timing").pack(anchor="w", padx=10, pady=5)
+        self.diagnostics_text = tk.Text(
+            diagnostics_frame, height=14, width=72, state="disabled",
+            bg="#3C3C3C", fg="#E0E0E0", font=("TkFixedFont",)
+        )
+        self.diagnostics_text.pack(fill="both", expand=True, padx=10, pady=5)
+        ttk.Button(
+            diagnostics_frame, text="Dump JSON", command=self.dump_metrics
+        ).pack(anchor="w", padx=10, pady=5)
+        self.root.after(1000, self.refresh_diagnostics)
 
     def validate_timeout(self, text):
         """Validate chat timeout input."""
@@ -779,29 +3973,31 @@ class VRChatOSCApp:
             text = pyperclip.paste()[:140]
             self.chat_text.set(text)
         except Exception as e:
-            print(f"Paste error: {e}")
+            log.warning(f"Paste error: {e}")
 
     def clear_chat(self):
         """Clear the VRChat chatbox."""
         try:
-            self.osc_client.send_message("/chatbox/input", ["", True, False])
+            self.sender.submit("", ChatboxSender.PRIORITY_CHAT, force=True)
             self.last_chat_time = None
-            print("Cleared chatbox")
+            log.info("Cleared chatbox")
             self.update_preview("Chatbox cleared")
         except Exception as e:
-            print(f"Clear chat error: {e}")
+            log.warning(f"Clear chat error: {e}")
 
     def send_chat(self, event=None):
         """Send chat message and add to history."""
         text = self.chat_text.get().strip()[:140]
         if text:
-            self.chat_history.append(text)
-            if len(self.chat_history) > 5:
-                self.chat_history.pop(0)
-            self.update_history()
-            self.last_chat_time = time.time()
-            self.osc_client.send_message("/chatbox/input", [text + ("\u0003\u001f" if self.config["skinny_mode"].get() else ""), True, False])
-            print(f"Sent chat: {text}")
+            self.last_chat = text
+            self.last_chat_time = time.monotonic()
+            self.sender.submit(text + self.snapshot.suffix, ChatboxSender.PRIORITY_CHAT, force=True)
+            log.info(f"Sent chat: {text}")
+            try:
+                self.chat_store.add(text)
+                self.history_list.added()
+            except sqlite3.Error as e:
+                log.warning(f"Chat history error: {e}")
             self.chat_text.set("")
         self.live_edit.set(False)
 
@@ -814,92 +4010,177 @@ class VRChatOSCApp:
         """Copy chat message to clipboard."""
         pyperclip.copy(text)
 
-    def update_history(self):
-        """Update chat history display."""
-        for widget in self.history_frame.winfo_children():
-            widget.destroy()
-        for idx, text in enumerate(reversed(self.chat_history)):
-            frame = ttk.Frame(self.history_frame)
-            frame.pack(fill="x", pady=2)
-            ttk.Label(frame, text=text, wraplength=300).pack(side="left", padx=5)
-            ttk.Button(
-                frame, text="Resend", command=lambda t=text: self.resend_chat(t)
-            ).pack(side="right", padx=2)
-            ttk.Button(
-                frame, text="Copy", command=lambda t=text: self.copy_chat(t)
-            ).pack(side="right", padx=2)
-
-    def update_preview(self, message):
-        """Update preview text."""
-        self.preview_text.config(state="normal")
-        self.preview_text.delete("1.0", tk.END)
-        self.preview_text.insert(tk.END, message)
-        self.preview_text.config(state="disabled")
+    def update_preview(self, message, sparkline=None):
+        """Queue a preview update; safe to call from any thread."""
+        self.preview_queue.put((message, sparkline))
+
+    def drain_preview(self):
+        """Apply the newest queued preview on the Tk thread."""
+        item = None
+        try:
+            while True:
+                item = self.preview_queue.get_nowait()
+        except queue.Empty:
+            pass
+        if item is not None:
+            message, sparkline = item
+            with hot_path_metrics.stage("preview"):
+                self.preview_text.config(state="normal")
+                self.preview_text.delete("1.0", tk.END)
+                self.preview_text.insert(tk.END, message)
+                self.preview_text.config(state="disabled")
+                if sparkline is not None:
+                    self.sparkline_label.config(text=sparkline)
+        if self.running:
+            self.root.after(100, self.drain_preview)
+
+    def refresh_diagnostics(self):
+        """Redraw the Diagnostics tab once a second."""
+        self.diagnostics_text.config(state="normal")
+        self.diagnostics_text.delete("1.0", tk.END)
+        self.diagnostics_text.insert(tk.END, hot_path_metrics.report())
+        self.diagnostics_text.config(state="disabled")
+        if self.running:
+            self.root.after(1000, self.refresh_diagnostics)
+
+    def dump_metrics(self):
+        """Write the hot-path metrics to METRICS_FILE."""
+        try:
+            hot_path_metrics.dump(METRICS_FILE)
+            log.info(f"Metrics written to {METRICS_FILE}")
+        except OSError as e:
+            log.warning(f"Metrics dump error: {e}")
+
+    def on_gpu_change(self, gpus, primary):
+        """Pick up GPUs found by a background re-check."""
+        self.gpus, self.detected_gpu = gpus, primary
+
+    def get_gpus(self):
+        """Return all GPUs and the primary one (user override or detected)."""
+        return self.gpus, pick_primary_gpu(self.gpus, self.detected_gpu, self.snapshot.primary_gpu)
+
+    def get_live_chat(self):
+        """Return the chat input while Live Edit is on."""
+        return self.live_chat
 
     def send_osc_messages(self):
-        """Send OSC messages based on config."""
+        """Send OSC messages based on config, one tick per update period."""
+        clock = TickClock(self.snapshot.update_period)
         while self.running:
+            config = self.snapshot
             try:
-                start_time = time.time()
-                if not self.program_running.get():
+                start_time = time.monotonic()
+                if not self.program_on:
                     self.update_preview("Program Off")
-                    time.sleep(2.0)
+                    clock.wait(config.update_period)
                     continue
 
-                stats = get_system_stats(self.gpu, self.config) if self.config["system_stats"]["enable"].get() else {}
-                time_str = get_current_time(self.config)
-                music_str = get_music_info(self.config)
-                chat_text = self.chat_text.get().strip() if self.live_edit.get() else ""
-
-                if not chat_text and self.last_chat_time:
-                    try:
-                        timeout = float(self.config["chat_timeout"].get())
-                    except ValueError:
-                        timeout = 5.0
-                    if time.time() - self.last_chat_time < timeout:
-                        chat_text = self.chat_history[-1] if self.chat_history else ""
+                recent_chat = ""
+                if self.last_chat_time:
+                    if time.monotonic() - self.last_chat_time < config.chat_timeout:
+                        recent_chat = self.last_chat
                     else:
                         self.last_chat_time = None
+                if not recent_chat and not self.live_chat and self.avatar.any_active(config.pause_on):
+                    self.update_preview("Paused by avatar parameter")
+                    clock.wait(config.update_period)
+                    continue
+                with hot_path_metrics.stage("collect"):
+                    stats, time_str, music_str, chat_text = collect_tick(
+                        self.scheduler.table, config, recent_chat, self.history, self.avatar
+                    )
 
-                message = build_message(stats, time_str, music_str, chat_text, self.config)
+                with hot_path_metrics.stage("build_message"):
+                    message = build_message(stats, time_str, music_str, chat_text, config)
 
-                self.osc_client.send_message("/chatbox/input", [message, True, False])
-                print(f"Sent: {message}")
+                self.sender.submit(message)
 
-                self.update_preview(message)
-                elapsed = time.time() - start_time
-                print(f"Update took {elapsed:.2f}s")
-                time.sleep(2.0)
+                sparkline = "\n".join(
+                    f"{label} {line}" for label, line in (
+                        ("CPU", self.history.sparkline("cpu_usage", config.average_window)),
+                        ("GPU", self.history.sparkline("gpu_usage", config.average_window)),
+                    ) if line
+                )
+                self.update_preview(message, sparkline)
+                elapsed = time.monotonic() - start_time
+                hot_path_metrics.observe("tick", elapsed, timeout=elapsed > config.update_period)
+                log.debug("Update took %.2fs", elapsed)
             except Exception as e:
-                print(f"OSC thread error: {e}. Restarting in 2s...")
-                time.sleep(2.0)
+                log.warning(f"OSC thread error: {e}. Retrying next tick...")
+            clock.wait(config.update_period)
 
     def shutdown(self):
         """Cleanup on exit."""
         self.save_config()
+        self.config_writer.close()
+        self.chat_store.close()
         self.running = False
+        self.scheduler.stop()
+        self.exporter.stop()
+        self.receiver.stop()
+        self.avatar_sender.stop()
+        self.sender.stop()
+        if nvidia_monitor:
+            nvidia_monitor.stop()
+        for monitor in radeontop_monitors.values():
+            monitor.stop()
         self.root.destroy()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Voi's Linux OSC for VRChat")
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="print time spent in each startup phase up to the first OSC message"
+    )
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="run without the GUI (tkinter is never imported)"
+    )
+    parser.add_argument(
+        "--once", action="store_true",
+        help="headless: sample once, send one message and exit"
+    )
+    parser.add_argument("--json", action="store_true", help="with --once, print the result as JSON")
+    parser.add_argument("--no-send", action="store_true", help="with --once, do not send the message")
+    parser.add_argument("--chat-stdin", action="store_true", help="headless: send each stdin line as chat")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file to read in headless mode")
+    parser.add_argument(
+        "--metrics-file", metavar="PATH",
+        help="headless: write hot-path timing metrics as JSON here on exit"
+    )
+    parser.add_argument(
+        "--log-level", default="info", choices=["debug", "info", "warning", "error"],
+        help="log verbosity; per-tick details are logged at debug"
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    print("Starting VRChat OSC script...")
-    try:
-        lspci = subprocess.run(
-            ["lspci", "-nn"], capture_output=True, text=True
-        )
-        print("Detected GPUs:")
-        for line in lspci.stdout.splitlines():
-            if "VGA" in line or "3D" in line:
-                print(line)
-        primary_gpu = select_primary_gpu()
-        if primary_gpu:
-            print(f"Using GPU: {primary_gpu['type']} at {primary_gpu['bus_id']} ({primary_gpu['card']})")
+    args = parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    startup_profiler.enabled = args.profile_startup
+    if args.headless or args.once:
+        runner = HeadlessRunner(args.config, chat_stdin=args.chat_stdin, metrics_file=args.metrics_file)
+        if args.once:
+            result = runner.once(send=not args.no_send)
+            print(json.dumps(result, indent=4) if args.json else result["message"])
         else:
-            print("No GPU selected; will try fallback")
-    except subprocess.SubprocessError as e:
-        print(f"Error listing GPUs: {e}")
+            runner.run()
+        sys.exit(0)
+
+    log.info("Starting VRChat OSC script...")
+    with startup_profiler.phase("gpu detection"):
+        gpus, primary_gpu = get_gpu_topology()
+    log.info("Detected GPUs:")
+    for gpu in gpus:
+        log.info(gpu["name"])
+    if primary_gpu:
+        log.info(f"Using GPU: {primary_gpu['type']} at {primary_gpu['bus_id']} ({primary_gpu['card']})")
+    else:
+        log.warning("No GPU selected; will try fallback")
 
-    root = tk.Tk()
-    print("Using darkly-inspired theme with blue accents and rounded widgets")
+    with startup_profiler.phase("tk init"):
+        root = tk.Tk()
+    log.info("Using darkly-inspired theme with blue accents and rounded widgets")
     app = VRChatOSCApp(root)
     root.protocol("WM_DELETE_WINDOW", app.shutdown)
     root.mainloop()
@@ -0,0 +1,327 @@
+"""Benchmark the ELOV pipeline against a fixture sysfs tree, stub tools and a local UDP sink.
+
+Builds a throwaway system (two GPUs, a k10temp sensor, /proc/stat) plus stub
+playerctl/radeontop/nvidia-smi/xrandr/glxinfo scripts, then measures:
+
+  * startup: launch of `ELOV.py --once` until its message reaches the sink
+  * detection: get_gpu_info + choose_primary_gpu (the xrandr output must map to the AMD card)
+  * tick: HeadlessRunner.tick, the headless loop body, against its running providers
+  * providers: the slowest provider's p95 call time while the ticks run
+  * throughput: messages per second through ChatboxSender with rate limiting off
+
+Results can be saved as a baseline; later runs fail (exit 1) when a metric
+regresses past the threshold:
+
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --threshold 0.25
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ELOV_SCRIPT = os.path.join(HERE, "ELOV.py")
+
+# metric -> (unit, True when bigger is better)
+METRICS = {
+    "startup_s": ("s", False),
+    "detection_ms": ("ms", False),
+    "tick_p50_ms": ("ms", False),
+    "tick_p95_ms": ("ms", False),
+    "provider_p95_ms": ("ms", False),
+    "msgs_per_sec": ("msg/s", True),
+}
+
+STUBS = {
+    "playerctl": (
+        "#!/bin/sh\n"
+        "while true; do\n"
+        "  printf 'Playing\\tBenchmark Song\\tBenchmark Artist\\t61000000\\t215000000\\n'\n"
+        "  sleep 1\n"
+        "done\n"
+    ),
+    "radeontop": (
+        "#!/bin/sh\n"
+        "echo 'Dumping to -, until termination.'\n"
+        "while true; do\n"
+        "  echo '1700000000.000000: bus 28, gpu 42.50%, ee 0.00%, vgt 1.67%, ta 7.50%, sx 7.50%, sh 0.00%, "
+        "spi 9.17%, sc 7.50%, pa 0.00%, db 7.50%, cb 7.50%, vram 12.34% 1010.88mb, gtt 0.51% 41.91mb, "
+        "mclk 100.00% 1.000ghz, sclk 43.21% 1.100ghz'\n"
+        "  sleep 1\n"
+        "done\n"
+    ),
+    "nvidia-smi": (
+        "#!/bin/sh\n"
+        "while true; do echo '00000000:01:00.0, 37, 61, 2048, 24564, 85.43, 1905'; sleep 1; done\n"
+    ),
+    "xrandr": (
+        "#!/bin/sh\n"
+        "echo 'Screen 0: minimum 320 x 200, current 2560 x 1440, maximum 16384 x 16384'\n"
+        "echo 'DP-1 connected primary 2560x1440+0+0 (normal left inverted right x axis y axis) 597mm x 336mm'\n"
+    ),
+    "glxinfo": (
+        "#!/bin/sh\n"
+        "echo 'OpenGL vendor string: AMD'\n"
+        "echo 'OpenGL renderer string: AMD Radeon RX 7900 XTX (radeonsi, navi31, LLVM 17.0.6, DRM 3.57)'\n"
+    ),
+}
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+def build_fixture(root, cpus=8):
+    """Create sys/, proc/, bin/ and home/ under root; return the environment that points ELOV at them."""
+    sys_root = os.path.join(root, "sys")
+    proc_root = os.path.join(root, "proc")
+    bin_dir = os.path.join(root, "bin")
+    home = os.path.join(root, "home")
+    devices = os.path.join(sys_root, "bus", "pci", "devices")
+    for address, vendor, device, card in (("0000:28:00.0", "0x1002", "0x744c", "card1"),
+                                          ("0000:01:00.0", "0x10de", "0x2684", "card0")):
+        pci = os.path.join(devices, address)
+        write(os.path.join(pci, "class"), "0x030000\n")
+        write(os.path.join(pci, "vendor"), vendor + "\n")
+        write(os.path.join(pci, "device"), device + "\n")
+        write(os.path.join(pci, "uevent"), f"PCI_SLOT_NAME={address}\n")
+        os.makedirs(os.path.join(pci, "drm", card), exist_ok=True)
+        drm = os.path.join(sys_root, "class", "drm", card)
+        os.makedirs(drm, exist_ok=True)
+        os.symlink(pci, os.path.join(drm, "device"))
+        if vendor == "0x1002":
+            write(os.path.join(pci, "gpu_busy_percent"), "42\n")
+            write(os.path.join(pci, "mem_info_vram_used"), f"{3 * 1024**3}\n")
+            write(os.path.join(pci, "mem_info_vram_total"), f"{24 * 1024**3}\n")
+            write(os.path.join(pci, "hwmon", "hwmon1", "temp1_input"), "55000\n")
+            # xrandr's primary output DP-1 is the AMD card's connector card1-DP-1
+            os.makedirs(os.path.join(sys_root, "class", "drm", f"{card}-DP-1"), exist_ok=True)
+    hwmon = os.path.join(sys_root, "class", "hwmon", "hwmon0")
+    write(os.path.join(hwmon, "name"), "k10temp\n")
+    write(os.path.join(hwmon, "temp1_label"), "Tctl\n")
+    write(os.path.join(hwmon, "temp1_input"), "61500\n")
+    lines = [f"cpu  {cpus * 1000} 0 {cpus * 500} {cpus * 8000} 100 0 10 0 0 0"]
+    lines += [f"cpu{n} {1000 + n} 0 500 8000 10 0 1 0 0 0" for n in range(cpus)]
+    write(os.path.join(proc_root, "stat"), "\n".join(lines + ["intr 0", ""]))
+    for name, script in STUBS.items():
+        path = os.path.join(bin_dir, name)
+        write(path, script)
+        os.chmod(path, 0o755)
+    os.makedirs(home, exist_ok=True)
+    env = os.environ.copy()
+    env.update({
+        "ELOV_SYSFS_ROOT": sys_root,
+        "ELOV_PROC_ROOT": proc_root,
+        "PATH": bin_dir + os.pathsep + env.get("PATH", ""),
+        "HOME": home,
+        # No session bus, so music falls back to the playerctl stub
+        "DBUS_SESSION_BUS_ADDRESS": "unix:path=" + os.path.join(root, "no-bus"),
+    })
+    return env
+
+class UdpSink:
+    """Count OSC datagrams arriving on a local UDP port."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.lock = threading.Lock()
+        self.count = 0
+        self.first_at = None
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            try:
+                self.sock.recv(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            with self.lock:
+                self.count += 1
+                if self.first_at is None:
+                    self.first_at = time.perf_counter()
+
+    def reset(self):
+        with self.lock:
+            self.count = 0
+            self.first_at = None
+
+    def wait_first(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            with self.lock:
+                if self.first_at is not None:
+                    return self.first_at
+            time.sleep(0.001)
+        return None
+
+    def close(self):
+        self.running = False
+        self.sock.close()
+
+def bench_config(port):
+    return {
+        "system_stats": {"enable": True, "cpu_temp": True, "gpu_usage": True, "gpu_temp": True,
+                         "ram_usage": True, "vram_usage": True, "gpu_display": "each"},
+        "time": {"enable": True},
+        "music": {"enable": True, "progress": True},
+        "app": {"ip": "127.0.0.1", "port": str(port), "send_interval": "0", "send_burst": "1000"},
+    }
+
+def measure_startup(env, config_path, sink, runs):
+    """Median seconds from launching `ELOV.py --once` to its message arriving at the sink."""
+    times = []
+    for _ in range(runs):
+        sink.reset()
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, ELOV_SCRIPT, "--once", "--config", config_path, "--log-level", "error"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        arrived = sink.wait_first(30.0)
+        process.wait()
+        if arrived is None:
+            raise RuntimeError("ELOV.py --once did not send a message to the sink")
+        times.append(arrived - start)
+    return statistics.median(times)
+
+def measure_in_process(env, config_path, sink, ticks, duration):
+    """Import ELOV against the fixture and time detection, the headless tick and sender throughput."""
+    os.environ.update(env)
+    sys.path.insert(0, HERE)
+    import ELOV
+
+    start = time.perf_counter()
+    gpus = ELOV.get_gpu_info()
+    primary = ELOV.choose_primary_gpu(gpus)
+    detection = time.perf_counter() - start
+    if len(gpus) != 2 or not primary:
+        raise RuntimeError(f"fixture GPUs not detected: {gpus}")
+    output_gpu = ELOV.get_primary_gpu_xrandr(gpus)
+    if not output_gpu or output_gpu["bus_id"] != "28:00.0":
+        raise RuntimeError(f"xrandr primary output not mapped to the AMD card: {output_gpu}")
+
+    runner = ELOV.HeadlessRunner(config_path)
+    runner.scheduler.start()
+    deadline = time.perf_counter() + 10.0
+    while any(age is None for age in runner.scheduler.table.ages().values()):
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"providers never published: {runner.scheduler.table.ages()}")
+        time.sleep(0.05)
+    tick_times = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        if runner.tick() is None:
+            raise RuntimeError("HeadlessRunner.tick produced no message")
+        tick_times.append(time.perf_counter() - start)
+        time.sleep(0.005)  # let the providers and the sender run between ticks
+    tick_times.sort()
+    stages = ELOV.hot_path_metrics.snapshot()
+    provider_p95 = max(stats["p95"] for name, stats in stages.items() if name.startswith("provider."))
+
+    sink.reset()
+    sender = runner.sender
+    end = time.perf_counter() + duration
+    sequence = 0
+    while time.perf_counter() < end:
+        sequence += 1
+        sender.submit(f"benchmark {sequence}")
+        time.sleep(0)
+    time.sleep(0.2)
+    throughput = sink.count / duration
+    runner.scheduler.stop()
+    sender.stop()
+
+    if ELOV.nvidia_monitor:
+        ELOV.nvidia_monitor.stop()
+    for monitor in ELOV.radeontop_monitors.values():
+        monitor.stop()
+    ELOV.get_music_provider().stop()
+    return {
+        "detection_ms": detection * 1000,
+        "tick_p50_ms": tick_times[len(tick_times) // 2] * 1000,
+        "tick_p95_ms": tick_times[int(len(tick_times) * 0.95) - 1] * 1000,
+        "provider_p95_ms": provider_p95 * 1000,
+        "msgs_per_sec": throughput,
+    }
+
+def compare(results, baseline, threshold):
+    """Return the metrics that regressed by more than threshold (a fraction) against the baseline."""
+    regressions = []
+    for name, (unit, bigger_is_better) in METRICS.items():
+        if name not in baseline or name not in results:
+            continue
+        old, new = baseline[name], results[name]
+        if bigger_is_better:
+            regressed = new < old * (1 - threshold)
+        else:
+            regressed = new > old * (1 + threshold)
+        if regressed:
+            regressions.append(f"{name}: {old:.3f} -> {new:.3f} {unit}")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark ELOV against fixture hardware")
+    parser.add_argument("--ticks", type=int, default=200, help="ticks to time in-process")
+    parser.add_argument("--startup-runs", type=int, default=3, help="ELOV.py --once launches to time")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds of sender throughput test")
+    parser.add_argument("--baseline", help="fail when results regress against this JSON file")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed regression as a fraction of the baseline (default 0.25)")
+    parser.add_argument("--keep", action="store_true", help="keep the fixture directory")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    root = tempfile.mkdtemp(prefix="elov-bench-")
+    sink = UdpSink()
+    try:
+        env = build_fixture(root)
+        config = bench_config(sink.port)
+        config_path = os.path.join(root, "config.json")
+        with open(config_path, "w") as f:
+            json.dump(config, f)
+        results = {"startup_s": measure_startup(env, config_path, sink, args.startup_runs)}
+        results.update(measure_in_process(env, config_path, sink, args.ticks, args.duration))
+    finally:
+        sink.close()
+        if args.keep:
+            print(f"Fixture kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for name, (unit, _) in METRICS.items():
+        print(f"{name:<16} {results[name]:10.3f} {unit}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"Regressed by more than {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""Avatar parameter mappings and normalisation."""
+
+import ELOV
+
+
+def test_parse_avatar_mapping():
+    mappings = ELOV.parse_avatar_mapping("cpu_temp=ELOV_CPUTemp:30:95:0.05, gpu_usage=/custom/gpu")
+    assert mappings == (
+        ELOV.AvatarMapping("cpu_temp", "/avatar/parameters/ELOV_CPUTemp", 30.0, 95.0, 0.05),
+        ELOV.AvatarMapping("gpu_usage", "/custom/gpu", 0.0, 100.0, ELOV.DEFAULT_DEADBAND),
+    )
+
+
+def test_parse_avatar_mapping_skips_malformed_and_unknown():
+    assert ELOV.parse_avatar_mapping("cpu_usage, cpu_temp=X:1:1, cpu_usage_avg=Y, ram_used=Z") == (
+        ELOV.AvatarMapping("ram_used", "/avatar/parameters/Z", 0.0, 1.0, ELOV.DEFAULT_DEADBAND),
+    )
+
+
+def test_avatar_normalize_ratio_and_range():
+    ram, temp = ELOV.parse_avatar_mapping("ram_used=R, cpu_temp=T:30:80")
+    stats = {"ram_used": 8.0, "ram_total": 32.0, "cpu_temp": 90.0}
+    assert ELOV.AvatarParameterSender.normalize(ram, stats) == 0.25
+    assert ELOV.AvatarParameterSender.normalize(temp, stats) == 1.0
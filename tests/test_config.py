@@ -0,0 +1,38 @@
+"""Config value parsing and versioned migration."""
+
+import ELOV
+
+
+def test_parse_port():
+    assert ELOV.parse_port("9000", 1) == 9000
+    assert ELOV.parse_port("nope", 9000) == 9000
+    assert ELOV.parse_port("70000", 9000) == 9000
+
+
+def test_migrate_config_current_and_newer():
+    assert ELOV.migrate_config({"app": {}}) == ({"app": {}}, False)
+    newer = {"version": ELOV.CONFIG_VERSION + 1}
+    assert ELOV.migrate_config(newer) == (newer, False)
+
+
+def test_migrate_config_runs_each_step(monkeypatch):
+    monkeypatch.setattr(ELOV, "CONFIG_VERSION", 3)
+    monkeypatch.setattr(ELOV, "CONFIG_MIGRATIONS", {
+        1: lambda data: dict(data, steps=data.get("steps", []) + [1]),
+        2: lambda data: dict(data, steps=data["steps"] + [2]),
+    })
+    assert ELOV.migrate_config({}) == ({"steps": [1, 2]}, True)
+    assert ELOV.migrate_config({"version": 2, "steps": []}) == ({"version": 2, "steps": [2]}, True)
+
+
+def test_migrate_config_invalid_version(monkeypatch):
+    assert ELOV.migrate_config({"version": 0}) == ({"version": 0}, False)
+    monkeypatch.setattr(ELOV, "CONFIG_VERSION", 2)
+    monkeypatch.setattr(ELOV, "CONFIG_MIGRATIONS", {1: lambda data: dict(data, step=1)})
+    assert ELOV.migrate_config({"version": -3}) == ({"version": -3, "step": 1}, True)
+
+
+def test_migrate_config_missing_step(monkeypatch):
+    monkeypatch.setattr(ELOV, "CONFIG_VERSION", 3)
+    monkeypatch.setattr(ELOV, "CONFIG_MIGRATIONS", {1: lambda data: dict(data, step=1)})
+    assert ELOV.migrate_config({"version": 2}) == ({"version": 2}, False)
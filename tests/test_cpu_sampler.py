@@ -0,0 +1,25 @@
+"""CPU usage from /proc/stat deltas, against a fixture procfs."""
+
+import os
+
+import ELOV
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_usage_from_deltas(tmp_path, monkeypatch):
+    monkeypatch.setattr(ELOV, "PROC_ROOT", str(tmp_path))
+    stat = str(tmp_path / "stat")
+    write(stat, "cpu  100 0 0 100 0 0 0 0\ncpu0 50 0 0 50 0 0 0 0\ncpu1 50 0 0 50 0 0 0 0\nintr 0\n")
+    sampler = ELOV.CpuSampler()
+    sampler.ccds = []
+    sampler.sample()
+    write(stat, "cpu  250 0 0 150 0 0 0 0\ncpu0 140 0 0 60 0 0 0 0\ncpu1 110 0 0 90 0 0 0 0\nintr 0\n")
+    sample = sampler.sample()
+    assert sample.usage == 75.0
+    assert sample.cores == [90.0, 60.0]
+    assert sample.max_core == 90.0
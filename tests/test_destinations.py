@@ -0,0 +1,29 @@
+"""Extra OSC destination parsing."""
+
+import ELOV
+
+
+def test_parse_destinations():
+    assert ELOV.parse_destinations("127.0.0.1:9100=/chatbox/*, 192.168.1.20:9000=/a/*|/b") == (
+        ("127.0.0.1", 9100, ("/chatbox/*",)),
+        ("192.168.1.20", 9000, ("/a/*", "/b")),
+    )
+    assert ELOV.parse_destinations("[::1]:9000, :9001") == (
+        ("::1", 9000, ("*",)),
+        ("127.0.0.1", 9001, ("*",)),
+    )
+
+
+def test_parse_destinations_skips_malformed():
+    assert ELOV.parse_destinations("host:abc, host:70000, , ok:1") == (("ok", 1, ("*",)),)
+
+
+def test_fanout_skips_unresolved_until_resolved(caplog):
+    fanout = ELOV.OscFanout()
+    destination = ELOV.OscDestination("localhost", 9, ("*",))
+    fanout.destinations = (destination,)
+    with caplog.at_level("DEBUG", logger="ELOV"):
+        fanout.send_dgram(b"", ["/chatbox/input"])
+    assert "not resolved yet" in caplog.text
+    fanout.resolve_pending()
+    assert destination.sockaddr is not None
@@ -0,0 +1,58 @@
+"""GPU enumeration against a fixture sysfs, and per-GPU sampling."""
+
+import os
+from types import SimpleNamespace
+
+import ELOV
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_get_gpu_info(tmp_path, monkeypatch):
+    devices = tmp_path / "bus" / "pci" / "devices"
+    for address, pci_class, vendor, card in (("0000:28:00.0", "0x030000", "0x1002", "card1"),
+                                             ("0000:01:00.0", "0x030200", "0x10de", "card0"),
+                                             ("0000:00:14.0", "0x0c0330", "0x8086", None)):
+        write(str(devices / address / "class"), pci_class + "\n")
+        write(str(devices / address / "vendor"), vendor + "\n")
+        write(str(devices / address / "device"), "0x1234\n")
+        if card:
+            os.makedirs(devices / address / "drm" / card)
+    monkeypatch.setattr(ELOV, "SYSFS_ROOT", str(tmp_path))
+    gpus = sorted(ELOV.get_gpu_info(), key=lambda gpu: gpu["bus_id"])
+    assert [(gpu["bus_id"], gpu["type"], gpu["card"]) for gpu in gpus] == [
+        ("01:00.0", "nvidia", "card0"),
+        ("28:00.0", "amd", "card1"),
+    ]
+    assert "3D controller" in gpus[0]["name"]
+
+
+def test_fingerprint_tracks_drm_nodes_and_driver(tmp_path, monkeypatch):
+    device = tmp_path / "bus" / "pci" / "devices" / "0000:28:00.0"
+    for attr, value in (("class", "0x030000"), ("vendor", "0x1002"), ("device", "0x1234")):
+        write(str(device / attr), value + "\n")
+    monkeypatch.setattr(ELOV, "SYSFS_ROOT", str(tmp_path))
+    bare = ELOV.pci_fingerprint()
+    os.makedirs(device / "drm" / "card0")
+    with_card = ELOV.pci_fingerprint()
+    os.symlink("../../../bus/pci/drivers/amdgpu", device / "driver")
+    with_driver = ELOV.pci_fingerprint()
+    assert len({bare, with_card, with_driver}) == 3
+
+
+def test_gpu_stats_sample_every_gpu_in_primary_mode(monkeypatch):
+    gpus = [{"bus_id": "01:00.0"}, {"bus_id": "28:00.0"}]
+    usage = {"01:00.0": 10.0, "28:00.0": 80.0}
+    monkeypatch.setattr(ELOV, "sample_gpu", lambda gpu, config: {"bus_id": gpu["bus_id"], "usage": usage[gpu["bus_id"]]})
+    config = SimpleNamespace(sampled={"gpu_usage"}, gpu_display="primary", gpu_selected=())
+    stats = ELOV.get_gpu_stats(gpus, gpus[1], config)
+    assert [entry["bus_id"] for entry in stats["gpus"]] == ["01:00.0", "28:00.0"]
+    assert stats["gpu_usage"] == 80.0
+    config.gpu_selected = ("01:00.0",)
+    stats = ELOV.get_gpu_stats(gpus, gpus[1], config)
+    assert [entry["bus_id"] for entry in stats["gpus"]] == ["01:00.0", "28:00.0"]
+    assert stats["gpu_usage"] == 80.0
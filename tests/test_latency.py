@@ -0,0 +1,25 @@
+"""Latency histogram quantiles."""
+
+import ELOV
+
+
+def test_quantile_uses_bucket_bounds_capped_at_max():
+    histogram = ELOV.LatencyHistogram()
+    for seconds in (0.0004, 0.0004, 0.003, 0.02):
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.0005
+    assert histogram.quantile(0.75) == 0.005
+    assert histogram.quantile(1.0) == 0.02  # bucket bound 0.025, capped at the max
+
+
+def test_quantile_never_exceeds_max():
+    histogram = ELOV.LatencyHistogram()
+    histogram.observe(0.003)
+    assert histogram.quantile(0.5) == 0.003
+
+
+def test_quantile_overflow_and_empty():
+    histogram = ELOV.LatencyHistogram()
+    assert histogram.quantile(0.5) == 0.0
+    histogram.observe(7.5)
+    assert histogram.quantile(0.99) == 7.5
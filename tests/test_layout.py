@@ -0,0 +1,48 @@
+"""Chatbox layout: elision, priority fitting and templates."""
+
+import ELOV
+
+
+def segment(text, priority, shrinkable=False):
+    return ELOV.Segment(text, priority, shrinkable)
+
+
+def test_elide():
+    assert ELOV.elide("short", 10) == "short"
+    assert ELOV.elide("Artist - A Long Song Title", 16) == "Artist - A Long…"
+    assert ELOV.elide("Unbreakable", 5) == ""
+
+
+def test_fit_layout_drops_least_important_first():
+    lines = [[segment("CPU 10%", 0), segment("RAM 8/32GB", 4)], [segment("12:00", 1)]]
+    assert ELOV.fit_layout(lines) == "CPU 10% | RAM 8/32GB\n12:00"
+    assert ELOV.fit_layout(lines, limit=13) == "CPU 10%\n12:00"
+
+
+def test_fit_layout_shrinks_free_text():
+    lines = [[segment("CPU 10%", 0)], [segment("Artist - A Long Song Title", 5, shrinkable=True)]]
+    assert ELOV.fit_layout(lines, limit=24) == "CPU 10%\nArtist - A Long…"
+
+
+def test_fit_layout_line_limit():
+    lines = [[segment(str(n), n)] for n in range(4)]
+    assert ELOV.fit_layout(lines, max_lines=2) == "0\n1"
+
+
+def test_template_hides_segments_with_missing_values():
+    template = ELOV.ChatboxTemplate("CPU {cpu_usage:.0f}% | {music}\\n{time}")
+    lines = template.render({"cpu_usage": 12.34, "music": "", "time": "12:00"})
+    assert ELOV.fit_layout(lines) == "CPU 12%\n12:00"
+    assert lines[0][0].priority == ELOV.FIELD_PRIORITIES["cpu_usage"]
+
+
+def test_template_marks_string_values_shrinkable():
+    template = ELOV.ChatboxTemplate("♪ {music}")
+    (line,) = template.render({"music": "Song"})
+    assert line == [ELOV.Segment("♪ Song", ELOV.FIELD_PRIORITIES["music"], True)]
+
+
+def test_compile_template_rejects_bad_fields():
+    assert ELOV.compile_template("") is None
+    assert ELOV.compile_template("{stats[0]}") is None
+    assert isinstance(ELOV.compile_template("{cpu_usage}"), ELOV.ChatboxTemplate)
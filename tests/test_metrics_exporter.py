@@ -0,0 +1,18 @@
+"""Metrics exporter port handling."""
+
+import pytest
+
+import ELOV
+
+
+@pytest.mark.parametrize("port", ["70000", "-1", "0", "abc"])
+def test_start_rejects_invalid_port(port):
+    exporter = ELOV.MetricsExporter(ELOV.LatestValues(), lambda: None)
+    with pytest.raises(ValueError):
+        exporter.start(port)
+    assert exporter.server is None
+
+
+def test_optional_port():
+    assert ELOV.optional_port("") is None
+    assert ELOV.optional_port("9100") == 9100
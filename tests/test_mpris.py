@@ -0,0 +1,85 @@
+"""MPRIS over D-Bus, against a private dbus-daemon with fake players."""
+
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+import ELOV
+
+jeepney = pytest.importorskip("jeepney")
+from jeepney import message_bus, new_error, new_method_return  # noqa: E402
+from jeepney.io.blocking import open_dbus_connection  # noqa: E402
+
+pytestmark = pytest.mark.skipif(shutil.which("dbus-daemon") is None, reason="dbus-daemon not installed")
+
+PROPERTIES = {
+    "PlaybackStatus": ("s", "Playing"),
+    "Rate": ("d", 1.0),
+    "Position": ("x", 5_000_000),
+    "Metadata": ("a{sv}", {
+        "xesam:title": ("s", "Song"),
+        "xesam:artist": ("as", ["Artist"]),
+        "mpris:length": ("x", 180_000_000),
+    }),
+}
+
+
+@pytest.fixture
+def bus():
+    daemon = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    try:
+        yield daemon.stdout.readline().strip()
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+
+class FakePlayer:
+    """Owns an MPRIS bus name and answers Properties.GetAll (or errors, if broken)."""
+
+    def __init__(self, address, name, broken=False):
+        self.conn = open_dbus_connection(bus=address)
+        self.conn.send_and_get_reply(message_bus.RequestName(name))
+        self.broken = broken
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while not self.stopped.is_set():
+            try:
+                msg = self.conn.receive(timeout=0.1)
+            except TimeoutError:
+                continue
+            if msg.header.message_type != jeepney.MessageType.method_call:
+                continue
+            if self.broken:
+                self.conn.send(new_error(msg, "org.freedesktop.DBus.Error.Failed", "s", ("broken",)))
+            else:
+                self.conn.send(new_method_return(msg, "a{sv}", (PROPERTIES,)))
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.conn.close()
+
+
+def test_dbus_backend_loads_players_and_skips_errors(bus):
+    players = [FakePlayer(bus, ELOV.MPRIS_PREFIX + "fake"), FakePlayer(bus, ELOV.MPRIS_PREFIX + "broken", broken=True)]
+    provider = ELOV.MusicProvider(bus_address=bus, playerctl="/nonexistent/playerctl")
+    provider.start()
+    try:
+        assert provider.ready.wait(5.0)
+        assert provider.backend == "dbus"
+        assert list(provider.players) == [ELOV.MPRIS_PREFIX + "fake"]
+        state = provider.snapshot()
+        assert (state.status, state.title, state.artist, state.length) == ("Playing", "Song", "Artist", 180.0)
+    finally:
+        provider.stop()
+        for player in players:
+            player.close()
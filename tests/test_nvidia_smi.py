@@ -0,0 +1,34 @@
+"""nvidia-smi stream parsing."""
+
+import ELOV
+
+
+def test_parse_line():
+    monitor = ELOV.NvidiaSmiMonitor()
+    assert monitor.parse_line("00000000:01:00.0, 37, 61, 2048, 24564, [N/A], 1905\n")
+    sample = monitor.get("01:00.0")
+    assert (sample.usage, sample.temp, sample.vram_used, sample.vram_total) == (37.0, 61.0, 2048.0, 24564.0)
+    assert sample.power is None and sample.clock == 1905.0
+
+
+def test_parse_line_ignores_other_output():
+    monitor = ELOV.NvidiaSmiMonitor()
+    assert not monitor.parse_line("No devices were found\n")
+    assert monitor.get("01:00.0") is None
+
+
+def test_normalize_bus_id():
+    assert ELOV.normalize_bus_id("00000000:01:00.0") == "01:00.0"
+    assert ELOV.normalize_bus_id("00000001:0A:00.0") == "0001:0a:00.0"
+
+
+def test_ready_after_failed_run(tmp_path):
+    fake = tmp_path / "nvidia-smi"
+    fake.write_text("#!/bin/sh\nexit 9\n")
+    fake.chmod(0o755)
+    monitor = ELOV.NvidiaSmiMonitor(command=str(fake))
+    monitor.start()
+    try:
+        assert monitor.ready.wait(2.0)
+    finally:
+        monitor.stop()
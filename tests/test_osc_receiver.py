@@ -0,0 +1,13 @@
+"""OSC receiver port handling."""
+
+import pytest
+
+import ELOV
+
+
+@pytest.mark.parametrize("port", ["70000", "-1", "abc"])
+def test_start_rejects_invalid_port(port):
+    receiver = ELOV.OscReceiver(ELOV.AvatarParameterCache())
+    with pytest.raises(ValueError):
+        receiver.start(port)
+    assert receiver.thread is None
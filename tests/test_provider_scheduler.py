@@ -0,0 +1,40 @@
+"""Provider scheduling: one worker thread per provider, replaced only when hung."""
+
+import threading
+import time
+
+import ELOV
+
+
+def worker_threads(name):
+    return [t for t in threading.enumerate() if t.name == f"provider-{name}-worker"]
+
+
+def test_worker_is_reused():
+    calls = []
+    scheduler = ELOV.ProviderScheduler()
+    scheduler.add("fast", lambda: calls.append(1) or len(calls), interval=0.01, timeout=1.0)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 2.0
+        while len(calls) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(calls) >= 5
+        assert len(worker_threads("fast")) == 1
+    finally:
+        scheduler.stop()
+
+
+def test_hung_worker_is_replaced_once():
+    release = threading.Event()
+    scheduler = ELOV.ProviderScheduler()
+    scheduler.add("hung", lambda: release.wait(), interval=0.01, timeout=0.05)
+    scheduler.start()
+    try:
+        time.sleep(0.5)
+        # The first hung worker was replaced; the replacement hangs too and is waited on
+        assert len(worker_threads("hung")) == 2
+        assert scheduler.table.get("hung") is None
+    finally:
+        scheduler.stop()
+        release.set()
@@ -0,0 +1,20 @@
+"""radeontop dump parsing."""
+
+import ELOV
+
+
+def test_parse_line():
+    monitor = ELOV.RadeontopMonitor("28:00.0")
+    assert monitor.parse_line(
+        "1700000000.000000: bus 28, gpu 42.50%, ee 0.00%, vram 12.34% 1010.88mb, "
+        "gtt 0.51% 41.91mb, mclk 100.00% 1.000ghz, sclk 43.21% 1.100ghz\n"
+    )
+    sample = monitor.get()
+    assert (sample.usage, sample.vram_mb, sample.gtt_mb, sample.sclk_ghz) == (42.5, 1010.88, 41.91, 1.1)
+    assert sample.blocks["ee"] == 0.0
+
+
+def test_parse_line_ignores_banner():
+    monitor = ELOV.RadeontopMonitor("28:00.0")
+    assert not monitor.parse_line("Dumping to -, until termination.\n")
+    assert monitor.get() is None
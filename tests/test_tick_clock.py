@@ -0,0 +1,53 @@
+"""Fixed-rate tick clock, on a fake clock."""
+
+import ELOV
+
+
+class FakeTime:
+    """Stands in for the time module: sleep() just advances monotonic()."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_tick_clock_keeps_fixed_deadlines(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(ELOV, "time", fake)
+    metrics = ELOV.HotPathMetrics()
+    monkeypatch.setattr(ELOV, "hot_path_metrics", metrics)
+    clock = ELOV.TickClock(2.0)
+    wakes = []
+    for _ in range(3):
+        fake.now += 0.3  # work done in the tick
+        clock.wait()
+        wakes.append(fake.now)
+    assert wakes == [1002.0, 1004.0, 1006.0]
+    assert metrics.counter_snapshot() == {"ticks": 3}
+
+
+def test_tick_clock_skips_missed_ticks(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(ELOV, "time", fake)
+    metrics = ELOV.HotPathMetrics()
+    monkeypatch.setattr(ELOV, "hot_path_metrics", metrics)
+    clock = ELOV.TickClock(1.0)
+    fake.now += 2.5  # overran two deadlines
+    clock.wait()
+    assert fake.now == 1003.0
+    assert metrics.counter_snapshot() == {"tick_overruns": 1, "tick_skipped": 2, "ticks": 1}
+
+
+def test_tick_clock_period_change(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(ELOV, "time", fake)
+    monkeypatch.setattr(ELOV, "hot_path_metrics", ELOV.HotPathMetrics())
+    clock = ELOV.TickClock(2.0)
+    clock.wait()
+    clock.wait(0.5)
+    assert fake.now == 1002.5